@@ -0,0 +1,6 @@
+# backend/__init__.py
+
+# Приложение Celery загружается вместе с Django, чтобы .delay() из view использовал его настройки
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
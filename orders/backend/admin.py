@@ -1,4 +1,6 @@
+from celery import current_app
 from django.contrib import admin, messages
+from django.utils import timezone
 from django.shortcuts import render, redirect
 from django.urls import path
 from django.utils.html import format_html
@@ -6,7 +8,8 @@ import yaml
 from django.core.files.storage import default_storage
 from .models import (
     User, Shop, Category, Product, ProductInfo, Parameter,
-    ProductParameter, Order, OrderItem, Contact, ConfirmEmailToken, ImportTask
+    ProductParameter, Order, OrderItem, Contact, ConfirmEmailToken, ImportTask, StockReservation,
+    OutgoingEmail, TaskExecution, DeadLetterTask, OutboxEvent
 )
 
 
@@ -54,8 +57,8 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(ProductInfo)
 class ProductInfoAdmin(admin.ModelAdmin):
-    list_display = ('product', 'shop', 'external_id', 'model', 'price', 'quantity')
-    list_filter = ('shop', 'product__category')
+    list_display = ('product', 'shop', 'external_id', 'model', 'price', 'quantity', 'delisted')
+    list_filter = ('shop', 'product__category', 'delisted')
     search_fields = ('product__name', 'model', 'external_id', 'shop__name')
 
 
@@ -74,8 +77,8 @@ class ProductParameterAdmin(admin.ModelAdmin):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'dt', 'state', 'contact')
-    list_filter = ('state', 'dt', 'user')
+    list_display = ('id', 'user', 'dt', 'state', 'contact', 'shop', 'parent', 'total')
+    list_filter = ('state', 'dt', 'shop', 'user')
     search_fields = ('user__email', 'id', 'contact__city', 'contact__phone')
     inlines = [OrderItemInline]
 
@@ -87,6 +90,57 @@ class ContactAdmin(admin.ModelAdmin):
     search_fields = ('user__email', 'city', 'phone', 'street')
 
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('order', 'product_info', 'quantity', 'expires_at')
+    list_filter = ('expires_at',)
+    search_fields = ('order__user__email', 'product_info__product__name')
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to_email', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to_email', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
+
+@admin.register(TaskExecution)
+class TaskExecutionAdmin(admin.ModelAdmin):
+    list_display = ('key', 'task_name', 'status', 'started_at', 'finished_at')
+    list_filter = ('status', 'task_name')
+    search_fields = ('key', 'task_id')
+
+
+@admin.register(DeadLetterTask)
+class DeadLetterTaskAdmin(admin.ModelAdmin):
+    list_display = ('task_name', 'task_id', 'exception', 'retries', 'failed_at', 'replayed_at')
+    list_filter = ('task_name', 'failed_at', 'replayed_at')
+    search_fields = ('task_id', 'idempotency_key', 'exception')
+    readonly_fields = ('task_name', 'task_id', 'args', 'kwargs', 'idempotency_key', 'exception',
+                       'traceback', 'retries', 'failed_at', 'replayed_at')
+    actions = ['replay']
+
+    @admin.action(description='Перезапустить выбранные задачи')
+    def replay(self, request, queryset):
+        replayed = 0
+        for dead_task in queryset.filter(replayed_at__isnull=True):
+            headers = {'idempotency_key': dead_task.idempotency_key} if dead_task.idempotency_key else None
+            current_app.tasks[dead_task.task_name].apply_async(
+                args=dead_task.args, kwargs=dead_task.kwargs, headers=headers)
+            dead_task.replayed_at = timezone.now()
+            dead_task.save(update_fields=['replayed_at'])
+            replayed += 1
+        self.message_user(request, f'Перезапущено задач: {replayed}', level=messages.SUCCESS)
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task_name', 'created_at', 'published_at')
+    list_filter = ('task_name', 'published_at')
+    readonly_fields = ('task_name', 'args', 'kwargs', 'created_at', 'published_at')
+
+
 @admin.register(ConfirmEmailToken)
 class ConfirmEmailTokenAdmin(admin.ModelAdmin):
     list_display = ('user', 'key', 'created_at')
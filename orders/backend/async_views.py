@@ -0,0 +1,91 @@
+# backend/async_views.py
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+
+from .authentication import CachedTokenAuthentication
+from .cart import get_basket_id
+from .models import Contact, OrderItem, ProductInfo
+from .renderers import ujson_dumps
+from .serializers import AddContactSerializer, CartItemSerializer, ProductInfoSerializer
+
+# Асинхронные версии эндпоинтов чтения для запуска под ASGI-сервером (uvicorn, см. docker-compose.yml).
+# Запросы к БД выполняются через асинхронный ORM, поэтому воркер не простаивает, пока ждёт БД.
+# DRF 3.14 не поддерживает async-представления, поэтому это обычные async-view Django
+# с теми же сериализаторами и той же аутентификацией (токен или сессия).
+
+
+def _json(data, status=200):
+    return HttpResponse(ujson_dumps(data), status=status, content_type='application/json')
+
+
+async def _get_user(request):
+    """Пользователь по токену (CachedTokenAuthentication) или по сессии; None — не аутентифицирован."""
+    try:
+        result = await sync_to_async(CachedTokenAuthentication().authenticate)(request)
+    except exceptions.AuthenticationFailed:
+        return None
+    if result is not None:
+        return result[0]
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def _login_required(view):
+    """Передаёт во view аутентифицированного пользователя или отвечает 401."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await _get_user(request)
+        if user is None:
+            return _json({'detail': 'Учетные данные не были предоставлены.'}, status=401)
+        return await view(request, user, *args, **kwargs)
+    return wrapper
+
+
+@require_GET
+async def product_list(request):
+    """
+    Список товаров (аналог ProductListView) с фильтрами shop_id, category_id и search.
+    """
+    queryset = ProductInfo.objects.filter(delisted=False).select_related('product', 'shop').prefetch_related(
+        'product_parameters__parameter')
+    shop_id = request.GET.get('shop_id')
+    category_id = request.GET.get('category_id')
+    search = request.GET.get('search')
+
+    if shop_id:
+        queryset = queryset.filter(shop_id=shop_id)
+    if category_id:
+        queryset = queryset.filter(product__category_id=category_id)
+    if search:
+        queryset = queryset.filter(product__name__icontains=search)
+
+    products = [product_info async for product_info in queryset]
+    return _json(ProductInfoSerializer(products, many=True).data)
+
+
+@require_GET
+@_login_required
+async def cart(request, user):
+    """
+    Содержимое корзины и её ID (аналог CartView.get).
+    """
+    cart_id = await sync_to_async(get_basket_id)(user)
+    items = [item async for item in OrderItem.objects.filter(order_id=cart_id).select_related(
+        'product_info__product', 'product_info__shop'
+    ).prefetch_related('product_info__product_parameters__parameter')]
+    return _json({'basket_id': cart_id, 'items': CartItemSerializer(items, many=True).data})
+
+
+@require_GET
+@_login_required
+async def contact_list(request, user):
+    """
+    Контакты пользователя (аналог ContactListView).
+    """
+    contacts = [contact async for contact in Contact.objects.filter(user=user)]
+    return _json(AddContactSerializer(contacts, many=True).data)
@@ -0,0 +1,75 @@
+# backend/authentication.py
+
+import copy
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+# Кэш текущего процесса: {ключ кэша: (токен с пользователем, истекает в)}.
+# Объекты из него не отдаются наружу: каждый запрос получает свою копию
+_local_cache = {}
+_LOCAL_CACHE_MAX_SIZE = 10000
+
+
+def _cache_key(token_key):
+    # Ключ самого токена в имя ключа кэша не пишем; v2 — в кэше объект Token, а не User
+    return 'auth-token:v2:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def _copy_token(token):
+    """Копия токена со своей копией пользователя: запросы в разных потоках не делят изменяемые объекты"""
+    token_copy = copy.copy(token)
+    token_copy.user = copy.copy(token.user)
+    return token_copy
+
+
+def forget_tokens(token_keys):
+    """Сбрасывает закэшированных пользователей для токенов (деактивация, удаление токена)."""
+    cache_keys = [_cache_key(token_key) for token_key in token_keys]
+    for cache_key in cache_keys:
+        _local_cache.pop(cache_key, None)
+    cache.delete_many(cache_keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену (Authorization: Token <key>) без запросов к БД в обычном случае.
+    Пользователь по токену ищется:
+    - в кэше процесса (TOKEN_AUTH_LOCAL_TTL, несколько секунд);
+    - в общем кэше (TOKEN_AUTH_CACHE_TTL), ключ — хэш токена;
+    - в БД одним запросом Token + User.
+    Возвращает (user, token), как TokenAuthentication: request.auth — объект Token.
+    При деактивации пользователя или удалении токена общий кэш сбрасывается сигналами (backend/signals.py),
+    кэши других процессов устаревают не позже чем через TOKEN_AUTH_LOCAL_TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        now = time.monotonic()
+
+        cached = _local_cache.get(cache_key)
+        if cached is not None and cached[1] > now:
+            token = _copy_token(cached[0])
+        else:
+            # Общий кэш при каждом чтении возвращает новый объект
+            token = cache.get(cache_key)
+            if token is None:
+                try:
+                    token = Token.objects.select_related('user').get(key=key)
+                except Token.DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                cache.set(cache_key, token, settings.TOKEN_AUTH_CACHE_TTL)
+
+            if len(_local_cache) >= _LOCAL_CACHE_MAX_SIZE:
+                _local_cache.clear()
+            _local_cache[cache_key] = (_copy_token(token), now + settings.TOKEN_AUTH_LOCAL_TTL)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
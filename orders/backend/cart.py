@@ -0,0 +1,259 @@
+# backend/cart.py
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .db_routers import use_primary
+from .models import Order, OrderItem, ProductInfo, StockReservation
+
+
+class InsufficientStockError(Exception):
+    """На складе недостаточно товара"""
+
+    def __init__(self, product_info_ids=()):
+        super().__init__(product_info_ids)
+        self.product_info_ids = sorted(product_info_ids)
+
+
+class StaleBasketError(Exception):
+    """Закэшированный ID корзины устарел: заказ уже оформлен или удалён"""
+
+
+def _basket_cache_key(user_id):
+    return f'basket:{user_id}'
+
+
+def get_basket_id(user, create=True):
+    """
+    Возвращает ID корзины пользователя (Order со статусом 'basket').
+    ID кэшируется в общем кэше, поэтому обычный запрос к корзине не обращается к таблице заказов.
+    Единственность корзины гарантирует частичный уникальный индекс unique_user_basket.
+    Закэшированный ID может устареть, поэтому функции записи в корзину проверяют его (см. _lock_basket).
+
+    :param create: создать корзину, если её ещё нет; иначе вернуть None
+    """
+    cache_key = _basket_cache_key(user.pk)
+    basket_id = cache.get(cache_key)
+    if basket_id is not None:
+        return basket_id
+
+    # Кэшировать можно только ID, прочитанный из основной БД: реплика может отставать
+    with use_primary():
+        basket_id = Order.objects.filter(user=user, state='basket').values_list('id', flat=True).first()
+        if basket_id is None:
+            if not create:
+                return None
+            try:
+                with transaction.atomic():
+                    basket_id = Order.objects.create(user=user, state='basket').id
+            except IntegrityError:
+                # Корзину уже создал параллельный запрос
+                basket_id = Order.objects.filter(user=user, state='basket').values_list('id', flat=True).get()
+
+    cache.set(cache_key, basket_id, settings.BASKET_CACHE_TIMEOUT)
+    return basket_id
+
+
+def forget_basket(user_id):
+    """Сбрасывает закэшированный ID корзины (например, после оформления заказа)."""
+    cache.delete(_basket_cache_key(user_id))
+
+
+def _lock_basket(cart_id):
+    """
+    Блокирует строку корзины до конца транзакции и проверяет, что это всё ещё корзина.
+    Оформление заказа меняет статус той же строки, поэтому запись в корзину и её оформление
+    не могут пересечься, а устаревший ID из кэша приводит к StaleBasketError, а не к записи в оформленный заказ.
+    """
+    if not Order.objects.select_for_update().filter(id=cart_id, state='basket').values_list('id', flat=True):
+        raise StaleBasketError(cart_id)
+
+
+def parse_quantity(value, allow_zero=False):
+    """
+    Приводит количество из запроса (в form-data это строка) к int.
+    Бросает ValueError для нечисловых и отрицательных значений.
+    """
+    quantity = int(value)
+    if quantity < 0 or (quantity == 0 and not allow_zero):
+        raise ValueError('Количество должно быть положительным')
+    return quantity
+
+
+def reservations_enabled():
+    return bool(settings.CART_RESERVATION_TTL)
+
+
+def reserve_stock(order_id, product_info_id, quantity):
+    """
+    Резервирует товар: условный UPDATE увеличивает ProductInfo.reserved, только если свободного остатка
+    (quantity - reserved) хватает. Сам остаток не меняется, поэтому импорт прайса резервы не затирает.
+    Блокировок нет — при гонке один из запросов просто обновит 0 строк.
+    """
+    reserved = ProductInfo.objects.filter(
+        id=product_info_id, quantity__gte=F('reserved') + quantity
+    ).update(reserved=F('reserved') + quantity)
+    if not reserved:
+        if not ProductInfo.objects.filter(id=product_info_id).exists():
+            raise ProductInfo.DoesNotExist
+        raise InsufficientStockError([product_info_id])
+    StockReservation.objects.create(
+        order_id=order_id,
+        product_info_id=product_info_id,
+        quantity=quantity,
+        expires_at=timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL),
+    )
+
+
+def release_reservations(reservations):
+    """
+    Снимает резервы и уменьшает ProductInfo.reserved на их количество.
+    Строки резервов блокируются, поэтому параллельное снятие тех же резервов не уменьшит reserved дважды.
+    :return: количество снятых резервов
+    """
+    with transaction.atomic():
+        rows = list(reservations.select_for_update().values_list('id', 'product_info_id', 'quantity'))
+        if not rows:
+            return 0
+
+        released = defaultdict(int)
+        for _, product_info_id, quantity in rows:
+            released[product_info_id] += quantity
+
+        StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+        for product_info_id, quantity in released.items():
+            ProductInfo.objects.filter(id=product_info_id).update(reserved=F('reserved') - quantity)
+        return len(rows)
+
+
+def _increment_item(cart_id, product_info_id, quantity, check_stock):
+    items = OrderItem.objects.filter(order_id=cart_id, product_info_id=product_info_id)
+    if check_stock:
+        # Итоговое количество в корзине не должно превышать свободный остаток на складе
+        items = items.filter(product_info__quantity__gte=F('product_info__reserved') + F('quantity') + quantity)
+    return items.update(quantity=F('quantity') + quantity)
+
+
+def add_to_cart(cart_id, product_info_id, quantity):
+    """
+    Добавляет товар в корзину атомарными запросами без блокировок:
+    UPDATE ... SET quantity = quantity + N с условием по остатку, а при отсутствии позиции — INSERT.
+    Если включены резервы (CART_RESERVATION_TTL), количество сразу резервируется на время TTL.
+    """
+    with transaction.atomic():
+        _lock_basket(cart_id)
+        check_stock = not reservations_enabled()
+        if not check_stock:
+            reserve_stock(cart_id, product_info_id, quantity)
+
+        if _increment_item(cart_id, product_info_id, quantity, check_stock):
+            return
+
+        if check_stock:
+            stock = ProductInfo.objects.filter(id=product_info_id).values_list('quantity', 'reserved').first()
+            if stock is None:
+                raise ProductInfo.DoesNotExist
+            if quantity > stock[0] - stock[1]:
+                raise InsufficientStockError([product_info_id])
+
+        try:
+            with transaction.atomic():
+                OrderItem.objects.create(order_id=cart_id, product_info_id=product_info_id, quantity=quantity)
+        except IntegrityError:
+            # Позиция уже есть (или создана параллельным запросом) — значит не хватило остатка
+            # либо нужно повторить инкремент
+            if not _increment_item(cart_id, product_info_id, quantity, check_stock):
+                raise InsufficientStockError([product_info_id])
+
+
+def _upsert_items(cart_id, lines):
+    """
+    Один INSERT ... ON CONFLICT DO UPDATE SET quantity = quantity + EXCLUDED.quantity для всех позиций.
+    Прибавление выполняет сама БД, поэтому параллельные пакеты не теряют инкременты друг друга.
+    """
+    db = router.db_for_write(OrderItem)
+    qn = connections[db].ops.quote_name
+    table = qn(OrderItem._meta.db_table)
+    order, product_info, quantity = (qn(OrderItem._meta.get_field(name).column)
+                                     for name in ('order', 'product_info', 'quantity'))
+    values = ', '.join(['(%s, %s, %s)'] * len(lines))
+    params = [value for product_info_id, line_quantity in lines.items()
+              for value in (cart_id, product_info_id, line_quantity)]
+    with connections[db].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({order}, {product_info}, {quantity}) VALUES {values} '
+            f'ON CONFLICT ({order}, {product_info}) DO UPDATE SET {quantity} = {table}.{quantity} + EXCLUDED.{quantity}',
+            params,
+        )
+
+
+def add_many_to_cart(cart_id, lines):
+    """
+    Пакетно добавляет товары в корзину в одной транзакции.
+    Наличие товаров проверяется одним запросом по id__in, а позиции записываются одним bulk upsert
+    с прибавлением количества (см. _upsert_items) вместо get_or_create на каждую строку.
+    Без резервов остаток проверяется после записи тем же запросом для всех позиций,
+    при нехватке транзакция откатывается.
+
+    :param lines: словарь {product_info_id: quantity}
+    """
+    with transaction.atomic():
+        _lock_basket(cart_id)
+        found = set(ProductInfo.objects.filter(id__in=lines).values_list('id', flat=True))
+        missing = set(lines) - found
+        if missing:
+            raise ProductInfo.DoesNotExist(sorted(missing))
+
+        if reservations_enabled():
+            # Резервирование — отдельный условный UPDATE на каждую позицию, без блокировок
+            for product_info_id, quantity in lines.items():
+                reserve_stock(cart_id, product_info_id, quantity)
+
+        _upsert_items(cart_id, lines)
+
+        if not reservations_enabled():
+            shortage = list(OrderItem.objects.filter(
+                order_id=cart_id, product_info_id__in=lines,
+                product_info__quantity__lt=F('quantity') + F('product_info__reserved'),
+            ).values_list('product_info_id', flat=True))
+            if shortage:
+                raise InsufficientStockError(shortage)
+
+
+def set_item_quantity(order_item, quantity):
+    """
+    Устанавливает количество позиции корзины одним условным UPDATE.
+    При включённых резервах старый резерв снимается и ставится новый на нужное количество.
+    """
+    with transaction.atomic():
+        _lock_basket(order_item.order_id)
+        if reservations_enabled():
+            release_reservations(StockReservation.objects.filter(
+                order_id=order_item.order_id, product_info_id=order_item.product_info_id))
+            reserve_stock(order_item.order_id, order_item.product_info_id, quantity)
+            OrderItem.objects.filter(id=order_item.id).update(quantity=quantity)
+            return
+
+        updated = OrderItem.objects.filter(
+            id=order_item.id, product_info__quantity__gte=F('product_info__reserved') + quantity
+        ).update(quantity=quantity)
+        if not updated:
+            raise InsufficientStockError([order_item.product_info_id])
+
+
+def remove_cart_items(cart_id, items):
+    """
+    Удаляет позиции корзины, предварительно сняв их резервы.
+    :return: количество удалённых позиций
+    """
+    with transaction.atomic():
+        _lock_basket(cart_id)
+        release_reservations(StockReservation.objects.filter(
+            order_id=cart_id, product_info_id__in=items.values('product_info_id')))
+        return items.delete()[0]
@@ -0,0 +1,95 @@
+# backend/catalog_stats.py
+
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .models import Category, CategoryStats, ProductInfo, Shop, ShopStats
+
+# Сводки для эндпоинтов shops/ и categories/ хранятся в ShopStats и CategoryStats.
+# Их пересчитывает импорт прайса только для затронутых магазина и категорий,
+# поэтому запрос навигационного меню — это простое чтение маленькой таблицы без GROUP BY.
+# Пересчёт блокирует строки сводок до конца транзакции: параллельные импорты, затронувшие
+# одни и те же категории, пересчитывают их по очереди, и второй видит товары первого.
+
+
+def shop_category_ids(shop_id):
+    """ID категорий, в которых у магазина есть товары"""
+    return set(ProductInfo.objects.filter(shop_id=shop_id).values_list('product__category_id', flat=True).distinct())
+
+
+@transaction.atomic
+def refresh_shop_stats(shop_ids=None):
+    """Пересчитывает сводки магазинов shop_ids (None — всех) одним GROUP BY"""
+    _lock(ShopStats, 'shop', Shop, shop_ids)
+    queryset = ProductInfo.objects.filter(delisted=False)
+    if shop_ids is not None:
+        queryset = queryset.filter(shop_id__in=shop_ids)
+    rows = queryset.values('shop_id').annotate(
+        products=Count('id'),
+        categories=Count('product__category_id', distinct=True),
+        min_price=Min('price'),
+        max_price=Max('price'),
+    )
+    now = timezone.now()
+    stats = [
+        ShopStats(shop_id=row['shop_id'], products_count=row['products'], categories_count=row['categories'],
+                  min_price=row['min_price'], max_price=row['max_price'], updated_at=now)
+        for row in rows
+    ]
+    _save(ShopStats, 'shop', stats, shop_ids, ['products_count', 'categories_count'])
+
+
+@transaction.atomic
+def refresh_category_stats(category_ids=None):
+    """Пересчитывает сводки категорий category_ids (None — всех) по магазинам, принимающим заказы, одним GROUP BY"""
+    _lock(CategoryStats, 'category', Category, category_ids)
+    queryset = ProductInfo.objects.filter(delisted=False, shop__state=True)
+    if category_ids is not None:
+        queryset = queryset.filter(product__category_id__in=category_ids)
+    rows = queryset.values('product__category_id').annotate(
+        products=Count('product_id', distinct=True),
+        shops=Count('shop_id', distinct=True),
+        min_price=Min('price'),
+        max_price=Max('price'),
+    )
+    now = timezone.now()
+    stats = [
+        CategoryStats(category_id=row['product__category_id'], products_count=row['products'],
+                      shops_count=row['shops'], min_price=row['min_price'], max_price=row['max_price'],
+                      updated_at=now)
+        for row in rows
+    ]
+    _save(CategoryStats, 'category', stats, category_ids, ['products_count', 'shops_count'])
+
+
+def _lock(model, key, owner_model, ids):
+    """
+    Блокирует строки сводок ids (None — все) до конца транзакции, в порядке ключа, чтобы не было взаимных
+    блокировок. Недостающие строки сначала создаются: заблокировать можно только существующую строку.
+    """
+    if ids is None:
+        ids = owner_model.objects.values_list('pk', flat=True)
+    ids = sorted(ids)
+    model.objects.bulk_create([model(**{f'{key}_id': pk}) for pk in ids], ignore_conflicts=True)
+    list(model.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', flat=True))
+
+
+def _save(model, key, stats, ids, count_fields):
+    """Upsert пересчитанных сводок; сводки объектов, у которых не осталось товаров, удаляются"""
+    model.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=[key],
+        update_fields=[*count_fields, 'min_price', 'max_price', 'updated_at'],
+    )
+    stale = model.objects.exclude(pk__in=[obj.pk for obj in stats])
+    if ids is not None:
+        stale = stale.filter(pk__in=ids)
+    stale.delete()
+
+
+def refresh_catalog_stats(shop_ids=None, category_ids=None):
+    """Пересчитывает сводки магазинов и категорий; None — все"""
+    refresh_shop_stats(shop_ids)
+    refresh_category_stats(category_ids)
@@ -0,0 +1,117 @@
+# backend/checkout.py
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
+
+from .cart import InsufficientStockError, forget_basket
+from .models import Order, OrderItem, ProductInfo, StockReservation
+
+
+class CheckoutError(Exception):
+    """Корзину нельзя оформить (пуста или уже оформлена)"""
+
+
+def _decrement_stock(deltas, released):
+    """
+    Списывает остатки и снимает резервы заказа одним условным UPDATE ... SET quantity = CASE ..., reserved = CASE ...
+    Строка обновляется, только если без резервов этого заказа свободного остатка хватает,
+    поэтому число обновлённых строк меньше числа позиций означает нехватку товара.
+
+    :param deltas: {product_info_id: сколько списать}
+    :param released: {product_info_id: сколько было зарезервировано этим заказом}
+    """
+    product_info_ids = set(deltas) | set(released)
+    condition = Q()
+    for product_info_id in product_info_ids:
+        delta = deltas.get(product_info_id, 0)
+        if delta:
+            condition |= Q(id=product_info_id,
+                           quantity__gte=F('reserved') - released.get(product_info_id, 0) + delta)
+        else:
+            condition |= Q(id=product_info_id)
+
+    updated = ProductInfo.objects.filter(condition).update(
+        quantity=Case(
+            *[When(id=product_info_id, then=F('quantity') - delta) for product_info_id, delta in deltas.items()],
+            default=F('quantity'),
+            output_field=IntegerField(),
+        ),
+        reserved=Case(
+            *[When(id=product_info_id, then=F('reserved') - quantity)
+              for product_info_id, quantity in released.items()],
+            default=F('reserved'),
+            output_field=IntegerField(),
+        ),
+    )
+    if updated != len(product_info_ids):
+        stock = {
+            product_info_id: quantity - reserved
+            for product_info_id, quantity, reserved in ProductInfo.objects.filter(
+                id__in=product_info_ids).values_list('id', 'quantity', 'reserved')
+        }
+        raise InsufficientStockError([
+            product_info_id for product_info_id, delta in deltas.items()
+            if stock.get(product_info_id, 0) + released.get(product_info_id, 0) < delta
+        ])
+
+
+def place_order(basket, contact):
+    """
+    Оформляет корзину в одной транзакции:
+    - переводит её в статус 'confirmed' (повторное оформление той же корзины невозможно);
+    - списывает остатки со склада и снимает резервы корзины;
+    - фиксирует цены в позициях и сумму заказа;
+    - разбивает заказ на подзаказы по магазинам (с денормализованным shop_id),
+      перенося в них позиции, чтобы магазин находил свои заказы без join-ов.
+
+    :return: оформленный заказ
+    """
+    with transaction.atomic():
+        if not Order.objects.filter(id=basket.id, state='basket').update(state='confirmed', contact=contact):
+            raise CheckoutError('Корзина уже оформлена.')
+
+        items = list(OrderItem.objects.filter(order_id=basket.id).values_list(
+            'id', 'product_info_id', 'quantity', 'product_info__price', 'product_info__shop_id'))
+        if not items:
+            raise CheckoutError('Корзина пуста.')
+
+        # Списываем всё количество позиций, а резервы этого заказа снимаем (в том числе по товарам,
+        # которых уже нет в корзине). Строки резервов блокируются: иначе release_expired_reservations
+        # мог бы параллельно снять те же резервы и уменьшить reserved второй раз
+        reservations = list(StockReservation.objects.select_for_update().filter(
+            order_id=basket.id).values_list('id', 'product_info_id', 'quantity'))
+        reserved = defaultdict(int)
+        for _, product_info_id, quantity in reservations:
+            reserved[product_info_id] += quantity
+        deltas = defaultdict(int)
+        for _, product_info_id, quantity, _, _ in items:
+            deltas[product_info_id] += quantity
+        _decrement_stock(deltas, reserved)
+        StockReservation.objects.filter(id__in=[row[0] for row in reservations]).delete()
+
+        shop_totals = defaultdict(int)
+        for _, _, quantity, price, shop_id in items:
+            shop_totals[shop_id] += quantity * price
+        sub_orders = Order.objects.bulk_create([
+            Order(user_id=basket.user_id, state='confirmed', contact=contact,
+                  parent_id=basket.id, shop_id=shop_id, total=shop_total)
+            for shop_id, shop_total in shop_totals.items()
+        ])
+        sub_order_ids = {sub_order.shop_id: sub_order.id for sub_order in sub_orders}
+
+        # Цена и перенос в подзаказ — одним UPDATE ... CASE
+        OrderItem.objects.bulk_update(
+            [OrderItem(id=item_id, price=price, order_id=sub_order_ids[shop_id])
+             for item_id, _, _, price, shop_id in items],
+            ['price', 'order'],
+        )
+        total = sum(shop_totals.values())
+        Order.objects.filter(id=basket.id).update(total=total)
+
+        basket.state = 'confirmed'
+        basket.contact = contact
+        basket.total = total
+        transaction.on_commit(lambda: forget_basket(basket.user_id))
+    return basket
@@ -0,0 +1,52 @@
+# backend/db_routers.py
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_use_primary = ContextVar('use_primary', default=False)
+
+
+@contextmanager
+def use_primary():
+    """
+    Все чтения внутри блока идут в основную БД.
+    Используется для импорта и в запросах, изменяющих данные (см. ReplicaStickinessMiddleware).
+    """
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Отправляет чтения на реплики из settings.DATABASE_REPLICAS, а записи — в основную БД.
+    Чтение остаётся на основной БД, если:
+    - включён use_primary() (изменяющий запрос или недавняя запись пользователя, импорт);
+    - открыта транзакция в основной БД (оформление заказа, операции с корзиной).
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or _use_primary.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
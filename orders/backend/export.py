@@ -0,0 +1,81 @@
+# backend/export.py
+
+import csv
+from collections import defaultdict
+
+from .models import ProductInfo, ProductParameter
+from .renderers import ujson_dumps
+
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_COLUMNS = ('id', 'external_id', 'product', 'category_id', 'shop_id', 'shop', 'model',
+               'price', 'price_rrc', 'quantity', 'parameters')
+
+
+def iter_product_rows(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Построчно отдаёт каталог товаров в виде словарей.
+    ProductInfo читается через .iterator(chunk_size=...), параметры товаров
+    подгружаются одним запросом на каждую пачку, поэтому память не зависит от размера каталога.
+    """
+    if queryset is None:
+        queryset = ProductInfo.objects.filter(delisted=False)
+    rows = queryset.order_by('id').values_list(
+        'id', 'external_id', 'product__name', 'product__category_id',
+        'shop_id', 'shop__name', 'model', 'price', 'price_rrc', 'quantity',
+    ).iterator(chunk_size=chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _build_rows(chunk)
+            chunk = []
+    if chunk:
+        yield from _build_rows(chunk)
+
+
+def _build_rows(chunk):
+    parameters = defaultdict(dict)
+    product_parameters = ProductParameter.objects.filter(
+        product_info_id__in=[row[0] for row in chunk]
+    ).values_list('product_info_id', 'parameter__name', 'value')
+    for product_info_id, name, value in product_parameters:
+        parameters[product_info_id][name] = value
+
+    for (product_info_id, external_id, product_name, category_id,
+         shop_id, shop_name, model, price, price_rrc, quantity) in chunk:
+        yield {
+            'id': product_info_id,
+            'external_id': external_id,
+            'product': product_name,
+            'category_id': category_id,
+            'shop_id': shop_id,
+            'shop': shop_name,
+            'model': model,
+            'price': price,
+            'price_rrc': price_rrc,
+            'quantity': quantity,
+            'parameters': parameters.get(product_info_id, {}),
+        }
+
+
+def iter_ndjson(rows):
+    """Каждая строка — отдельный JSON-объект (application/x-ndjson)."""
+    for row in rows:
+        yield ujson_dumps(row) + '\n'
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи в буфер."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        row['parameters'] = ujson_dumps(row['parameters'])
+        yield writer.writerow([row[column] for column in CSV_COLUMNS])
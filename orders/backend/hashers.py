@@ -0,0 +1,20 @@
+# backend/hashers.py
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2 с параметрами из настроек (ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM).
+    Алгоритм тот же, что у стандартного Argon2PasswordHasher, поэтому при изменении параметров
+    хэш пересчитывается при следующем успешном входе (must_update).
+    """
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 с числом итераций из настроек (PBKDF2_ITERATIONS)."""
+    iterations = settings.PBKDF2_ITERATIONS
@@ -0,0 +1,111 @@
+# backend/http_bench.py
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+
+@dataclass
+class LoadResult:
+    """Результат нагрузочного прогона одного URL"""
+    requests: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    latencies: list = field(default_factory=list)
+    statuses: dict = field(default_factory=dict)
+
+    @property
+    def rps(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+
+async def _read_response(reader):
+    """
+    Читает HTTP/1.1-ответ.
+    :return: (статус, закрыть ли соединение)
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Соединение закрыто сервером')
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, True
+    return status, headers.get('connection') == 'close'
+
+
+async def _worker(url, request_bytes, counter, result):
+    connection = None
+    while counter[0] > 0:
+        counter[0] -= 1
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(url.hostname, url.port or 80)
+            reader, writer = connection
+            writer.write(request_bytes)
+            await writer.drain()
+            status, close = await _read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            result.errors += 1
+            status, close = 'error', True
+        else:
+            result.latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                result.errors += 1
+        result.requests += 1
+        result.statuses[status] = result.statuses.get(status, 0) + 1
+        if close and connection is not None:
+            connection[1].close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_load(url, total, concurrency, method='GET', headers=None, body=b''):
+    """
+    Отправляет total запросов на url, держа concurrency одновременных keep-alive соединений.
+    Клиент написан на asyncio без сторонних библиотек, поэтому сам почти не нагружает CPU.
+    """
+    parsed = urlsplit(url)
+    if parsed.scheme != 'http':
+        raise ValueError('Поддерживается только http://')
+    path = parsed.path or '/'
+    if parsed.query:
+        path += '?' + parsed.query
+
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {parsed.netloc}', 'Connection: keep-alive',
+             f'Content-Length: {len(body)}']
+    lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    request_bytes = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+    result = LoadResult()
+    counter = [total]
+    start = time.perf_counter()
+    await asyncio.gather(*[_worker(parsed, request_bytes, counter, result) for _ in range(concurrency)])
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,307 @@
+# backend/loadtest.py
+
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import yaml
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from .cart import add_many_to_cart, forget_basket, get_basket_id
+from .checkout import place_order
+from .http_bench import LoadResult
+from .models import Category, Contact, Order, ProductInfo, Shop, User
+from .utils import load_data, remove_stale_positions
+
+# Все сгенерированные данные помечены этими префиксами, по ним же удаляются
+USER_EMAIL = 'loadtest-{}@example.com'
+SHOP_NAME = 'Loadtest shop {}'
+CATEGORY_NAME = 'Loadtest {}'
+# ID категорий нужны формату прайса; удаляются категории по названию и связям с магазинами, а не по ID
+CATEGORY_ID_BASE = 900000
+CATEGORY_NAMES = ('Смартфоны', 'Аксессуары', 'Flash-накопители', 'Телевизоры', 'Ноутбуки')
+PRODUCT_WORDS = ('Смартфон', 'Наушники', 'Флешка', 'Телевизор', 'Ноутбук', 'Чехол', 'Зарядка')
+COLORS = ('черный', 'белый', 'красный', 'синий', 'золотистый')
+
+DEFAULT_WEIGHTS = {'browse': 50, 'search': 25, 'basket': 15, 'checkout': 5, 'history': 5}
+
+
+def make_price_list(shop_index, products):
+    """Прайс-лист магазина в формате data/shop*.yaml"""
+    return {
+        'shop': SHOP_NAME.format(shop_index),
+        'categories': [{'id': CATEGORY_ID_BASE + i, 'name': CATEGORY_NAME.format(name)}
+                       for i, name in enumerate(CATEGORY_NAMES)],
+        'goods': [
+            {
+                'id': shop_index * 1000000 + i + 1,
+                'category': CATEGORY_ID_BASE + i % len(CATEGORY_NAMES),
+                'model': f'loadtest/{i}',
+                'name': f'{PRODUCT_WORDS[i % len(PRODUCT_WORDS)]} Loadtest {i} ({COLORS[i % len(COLORS)]})',
+                'price': 1000 + i * 10 + shop_index,
+                'price_rrc': 1200 + i * 10,
+                # Остатка хватает на весь прогон, чтобы ошибки не маскировались нехваткой товара
+                'quantity': 10 ** 6,
+                'parameters': {'Цвет': COLORS[i % len(COLORS)], 'Гарантия (мес)': 12},
+            }
+            for i in range(products)
+        ],
+    }
+
+
+def seed(users, shops, products, baskets=0, orders=0, log=print):
+    """
+    Заполняет БД: магазины импортируются из сгенерированных прайс-листов через load_data,
+    покупатели создаются пачкой (с токенами и контактами), часть из них получает корзины и заказы.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        for shop_index in range(shops):
+            path = os.path.join(directory, f'shop{shop_index}.yaml')
+            with open(path, 'w', encoding='utf-8') as file:
+                yaml.safe_dump(make_price_list(shop_index, products), file, allow_unicode=True)
+            result = load_data(path)
+            if not result['Status']:
+                raise RuntimeError(result['Error'])
+    log(f'Импортировано магазинов: {shops}, товаров в каждом: {products}')
+
+    # Хэш пароля считается один раз — иначе создание пользователей заняло бы минуты
+    password = make_password('loadtest-password')
+    existing = set(User.objects.filter(email__startswith='loadtest-').values_list('email', flat=True))
+    User.objects.bulk_create([
+        User(email=USER_EMAIL.format(i), username=f'loadtest-{i}', password=password, is_active=True)
+        for i in range(users) if USER_EMAIL.format(i) not in existing
+    ])
+    buyers = list(User.objects.filter(email__in=[USER_EMAIL.format(i) for i in range(users)]).order_by('id'))
+    Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in buyers],
+                              ignore_conflicts=True)
+    with_contacts = set(Contact.objects.filter(user__in=buyers).values_list('user_id', flat=True))
+    Contact.objects.bulk_create([
+        Contact(user=user, city='Москва', street='Loadtest', house=str(i), phone='+70000000000')
+        for i, user in enumerate(buyers) if user.id not in with_contacts
+    ])
+    log(f'Покупателей: {len(buyers)}')
+
+    product_info_ids = list(ProductInfo.objects.filter(
+        shop__name__startswith='Loadtest shop').values_list('id', flat=True))
+    for user in buyers[:baskets + orders]:
+        # ID пользователей могут совпасть с удалёнными ранее (SQLite), а в кэше — остаться их корзины
+        forget_basket(user.pk)
+        add_many_to_cart(get_basket_id(user), {
+            product_info_id: random.randint(1, 3) for product_info_id in random.sample(product_info_ids, 3)
+        })
+    for user in buyers[baskets:baskets + orders]:
+        basket = Order.objects.get(id=get_basket_id(user))
+        place_order(basket, user.contacts.first())
+    log(f'Корзин: {baskets}, заказов: {orders}')
+
+
+def cleanup():
+    """
+    Удаляет всё, что создал seed(). Заказанные позиции защищены от удаления (OrderItem.product_info,
+    on_delete=PROTECT): если позиции тестовых магазинов попали в заказы не тестовых покупателей,
+    такие позиции снимаются с продажи, а их магазины и категории остаются.
+    """
+    users = User.objects.filter(email__startswith='loadtest-')
+    deleted_users = users.count()
+    Order.objects.filter(user__in=users).delete()
+    users.delete()
+    shops = Shop.objects.filter(name__startswith='Loadtest shop')
+    category_ids = list(Category.shops.through.objects.filter(shop__in=shops).values_list('category_id', flat=True))
+    # Чужие корзины очищаются, незаказанные позиции удаляются — как при исчезновении позиций из прайса
+    remove_stale_positions(list(ProductInfo.objects.filter(shop__in=shops).values_list('id', flat=True)))
+    shops.filter(product_infos__isnull=True).delete()
+    # Категория с тем же ID, созданная не нагрузочным тестом, сохраняет своё название и не удаляется;
+    # категория, к которой привязан другой магазин или товар из чужого заказа, тоже остаётся
+    Category.objects.filter(id__in=category_ids, name__startswith=CATEGORY_NAME.format(''),
+                            shops__isnull=True).exclude(products__product_infos__ordered_items__isnull=False).delete()
+    return deleted_users
+
+
+class InProcessTransport:
+    """Запросы к приложению в том же процессе через django.test.Client (без сети)"""
+
+    def __init__(self, token=None):
+        from django.test import Client
+
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token}') if token else Client()
+
+    def request(self, method, path, data=None):
+        response = self.client.generic(method, path, json.dumps(data) if data is not None else '',
+                                       content_type='application/json')
+        return response.status_code, _json_or_none(response.content)
+
+    def close(self):
+        # Каждый поток открывает своё соединение с БД
+        connection.close()
+
+
+class HTTPTransport:
+    """Запросы к запущенному серверу (runserver, uvicorn) через requests"""
+
+    def __init__(self, base_url, token=None):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f'Token {token}'
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.base_url + path, json=data, timeout=30)
+        return response.status_code, _json_or_none(response.content)
+
+    def close(self):
+        self.session.close()
+
+
+def _json_or_none(content):
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+class Recorder:
+    """Собирает задержки и ошибки по эндпоинтам из всех потоков"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.results = defaultdict(LoadResult)
+
+    def call(self, transport, endpoint, method, path, data=None):
+        start = time.perf_counter()
+        try:
+            status, body = transport.request(method, path, data)
+        except Exception as e:
+            # Исключение (таймаут, блокировка БД и т.п.) учитывается как ошибка с именем его класса
+            status, body = type(e).__name__, None
+        latency = time.perf_counter() - start
+        with self._lock:
+            result = self.results[endpoint]
+            result.requests += 1
+            result.statuses[status] = result.statuses.get(status, 0) + 1
+            result.latencies.append(latency)
+            if not isinstance(status, int) or status >= 400:
+                result.errors += 1
+        return status, body
+
+
+class Scenarios:
+    """Сценарии поведения покупателя; пути — как в requests_example.http"""
+
+    def __init__(self, product_info_ids, shop_ids, search_words):
+        self.product_info_ids = product_info_ids
+        self.shop_ids = shop_ids
+        self.search_words = search_words
+
+    def browse(self, recorder, transport, user):
+        recorder.call(transport, 'GET products/?shop_id', 'GET',
+                      f'/api/v1/products/?shop_id={random.choice(self.shop_ids)}')
+
+    def search(self, recorder, transport, user):
+        recorder.call(transport, 'GET products/?search', 'GET',
+                      f'/api/v1/products/?search={random.choice(self.search_words)}')
+
+    def basket(self, recorder, transport, user):
+        recorder.call(transport, 'POST basket/', 'POST', '/api/v1/basket/',
+                      {'product_info_id': random.choice(self.product_info_ids), 'quantity': 1})
+        recorder.call(transport, 'GET basket/', 'GET', '/api/v1/basket/')
+
+    def checkout(self, recorder, transport, user):
+        self.basket(recorder, transport, user)
+        status, body = recorder.call(transport, 'GET basket/', 'GET', '/api/v1/basket/')
+        if status == 200 and body:
+            recorder.call(transport, 'POST orders/confirm/', 'POST', '/api/v1/orders/confirm/',
+                          {'basket_id': body['basket_id'], 'contact_id': user['contact_id']})
+
+    def history(self, recorder, transport, user):
+        recorder.call(transport, 'GET orders/history/', 'GET', '/api/v1/orders/history/')
+
+
+def parse_http_file(path, base_path='/api/v1'):
+    """
+    Разбирает файл в формате REST Client (requests_example.http) в список (метод, путь, тело).
+    {{baseUrl}} заменяется на base_path; тело разбирается как JSON, если это возможно.
+    """
+    with open(path, encoding='utf-8') as file:
+        text = file.read()
+
+    requests = []
+    for block in re.split(r'^###.*$', text, flags=re.MULTILINE):
+        lines = [line for line in block.splitlines() if not line.startswith(('#', '@'))]
+        while lines and not lines[0].strip():
+            lines.pop(0)
+        if not lines:
+            continue
+        method, _, url = lines[0].strip().partition(' ')
+        url = url.replace('{{baseUrl}}', base_path)
+        body_lines = []
+        in_body = False
+        for line in lines[1:]:
+            if in_body:
+                body_lines.append(line)
+            elif not line.strip():
+                in_body = True
+        body = None
+        if method not in ('GET', 'DELETE'):
+            try:
+                body = json.loads('\n'.join(body_lines)) if ''.join(body_lines).strip() else None
+            except ValueError:
+                body = None
+        requests.append((method.upper(), url.strip(), body))
+    return requests
+
+
+def run(make_transport, weights, concurrency, duration=None, iterations=None, replay=None):
+    """
+    Запускает concurrency виртуальных покупателей (потоков), каждый выполняет сценарии,
+    выбранные случайно с весами weights, в течение duration секунд или iterations раз.
+    replay — запросы из parse_http_file, которые выполняются по порядку в каждой итерации вместо сценариев.
+
+    :param make_transport: функция token -> транспорт
+    :return: (Recorder, общее время, сек.)
+    """
+    users = list(User.objects.filter(email__startswith='loadtest-').order_by('id').values('id', 'auth_token__key'))
+    if not users:
+        raise RuntimeError('Нет тестовых покупателей, сначала выполните заполнение БД (--seed)')
+    contacts = dict(Contact.objects.filter(user_id__in=[user['id'] for user in users]).values_list('user_id', 'id'))
+    scenarios = Scenarios(
+        list(ProductInfo.objects.filter(shop__name__startswith='Loadtest shop').values_list('id', flat=True)),
+        list(Shop.objects.filter(name__startswith='Loadtest shop').values_list('id', flat=True)),
+        ['Loadtest', *PRODUCT_WORDS],
+    )
+    names, scenario_weights = zip(*[(name, weight) for name, weight in weights.items() if weight > 0])
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def virtual_user(index):
+        user = users[index % len(users)]
+        user = {'token': user['auth_token__key'], 'contact_id': contacts.get(user['id'])}
+        transport = make_transport(user['token'])
+        try:
+            done = 0
+            while (iterations is None or done < iterations) and (deadline is None or time.perf_counter() < deadline):
+                if replay:
+                    for method, path, body in replay:
+                        recorder.call(transport, f'{method} {path.split("?")[0]}', method, path, body)
+                else:
+                    name = random.choices(names, scenario_weights)[0]
+                    getattr(scenarios, name)(recorder, transport, user)
+                done += 1
+        finally:
+            transport.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - start
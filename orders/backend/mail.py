@@ -0,0 +1,98 @@
+# backend/mail.py
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, body, to_email):
+    """
+    Ставит письмо в очередь. Отправляет его flush_outgoing_emails пачкой вместе с остальными,
+    поэтому задача, сформировавшая письмо, не ждёт SMTP.
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject, body=body, to_email=to_email, next_attempt_at=timezone.now())
+
+
+def _retry_delay(attempts):
+    """Экспоненциальная задержка перед повторной отправкой: base * 2^(attempts - 1), не более max."""
+    return min(settings.EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1), settings.EMAIL_RETRY_BACKOFF_MAX)
+
+
+def _claim_batch(batch_size):
+    """
+    Забирает пачку писем, которые пора отправить. next_attempt_at сдвигается на EMAIL_SEND_LEASE,
+    поэтому параллельный flush их не возьмёт, а если воркер упадёт — письма вернутся в очередь.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(OutgoingEmail.objects.select_for_update(skip_locked=True).filter(
+            status='pending', next_attempt_at__lte=now
+        ).order_by('next_attempt_at')[:batch_size])
+        OutgoingEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_SEND_LEASE))
+    return emails
+
+
+def flush_outgoing_emails(batch_size=None):
+    """
+    Отправляет накопившиеся письма через одно SMTP-соединение (get_connection()).
+    Ошибка отправки одного письма не мешает остальным: письмо откладывается с экспоненциальной
+    задержкой, а после EMAIL_MAX_ATTEMPTS попыток помечается как 'failed'.
+
+    :return: (отправлено, ошибок)
+    """
+    emails = _claim_batch(batch_size or settings.EMAIL_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+
+    sent, failed = [], 0
+    connection = get_connection(fail_silently=False)
+    try:
+        for i, email in enumerate(emails):
+            try:
+                # Открыто ли уже соединение, проверяет сам backend; после ошибки оно переоткрывается
+                connection.open()
+            except Exception as e:
+                # SMTP-сервер недоступен: оставшиеся письма тоже откладываются с увеличением attempts,
+                # иначе они так и остались бы в аренде без счётчика попыток
+                for rest in emails[i:]:
+                    _mark_failed(rest, e)
+                failed += len(emails) - i
+                break
+            message = EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL,
+                                   [email.to_email], connection=connection)
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                failed += 1
+                _mark_failed(email, e)
+                # Соединение могло оборваться — закрываем его, следующее письмо откроет новое
+                connection.close()
+            else:
+                sent.append(email.id)
+    finally:
+        connection.close()
+        if sent:
+            OutgoingEmail.objects.filter(id__in=sent).update(
+                status='sent', sent_at=timezone.now(), last_error='')
+    return len(sent), failed
+
+
+def _mark_failed(email, error):
+    attempts = email.attempts + 1
+    logger.warning('Email %s to %s failed (attempt %s): %s', email.id, email.to_email, attempts, error)
+    OutgoingEmail.objects.filter(id=email.id).update(
+        attempts=attempts,
+        last_error=str(error),
+        status='failed' if attempts >= settings.EMAIL_MAX_ATTEMPTS else 'pending',
+        next_attempt_at=timezone.now() + timedelta(seconds=_retry_delay(attempts)),
+    )
@@ -0,0 +1,32 @@
+# backend/management/commands/bench_http.py
+
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.http_bench import run_load
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест запущенного сервера: запросы/с и задержки p50/p99 для каждого URL. '
+            'Например, WSGI и ASGI: '
+            'bench_http http://localhost:8000/api/v1/products/ http://localhost:8001/api/v1/async/products/')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='URL для сравнения')
+        parser.add_argument('--requests', type=int, default=2000, help='Количество запросов на каждый URL')
+        parser.add_argument('--concurrency', type=int, default=100, help='Одновременных соединений')
+        parser.add_argument('--token', help='Токен API (заголовок Authorization: Token ...)')
+
+    def handle(self, *args, **options):
+        headers = {'Authorization': f'Token {options["token"]}'} if options['token'] else {}
+        for url in options['urls']:
+            try:
+                result = asyncio.run(run_load(url, options['requests'], options['concurrency'], headers=headers))
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                f'{url}\n'
+                f'  {result.rps:8.0f} запр/с  p50 {result.percentile(50) * 1000:7.1f} мс  '
+                f'p99 {result.percentile(99) * 1000:7.1f} мс  ошибок {result.errors}  статусы {result.statuses}'
+            )
@@ -0,0 +1,77 @@
+# backend/management/commands/bench_json.py
+
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.renderers import JSONRenderer
+from backend.renderers import UJSONRenderer, ORJSONRenderer, orjson
+
+
+def make_product_list(count):
+    """Список товаров в формате ProductInfoSerializer"""
+    return [
+        {
+            'id': i,
+            'product': {'name': f'Смартфон Apple iPhone XS Max 512GB ({i})'},
+            'shop': {'name': f'Связной {i % 10}'},
+            'model': 'apple/iphone/xs-max',
+            'price': 110000 + i,
+            'quantity': i % 50,
+            'product_parameters': [
+                {'parameter': {'name': 'Диагональ (дюйм)'}, 'value': '6.5'},
+                {'parameter': {'name': 'Разрешение (пикс)'}, 'value': '2688x1242'},
+                {'parameter': {'name': 'Встроенная память (Гб)'}, 'value': '512'},
+                {'parameter': {'name': 'Цвет'}, 'value': 'золотистый'},
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def make_order_history(count, items_per_order=5):
+    """История заказов в формате OrderHistorySerializer (с datetime, Decimal и lazy-строками)"""
+    now = timezone.now()
+    products = make_product_list(items_per_order)
+    return [
+        {
+            'id': i,
+            'dt': now - timedelta(minutes=i),
+            'state': _('Подтвержден'),
+            'ordered_items': [
+                {'product_info': product, 'quantity': 2, 'total_price': Decimal('220000.00')}
+                for product in products
+            ],
+            'total_price': Decimal('1100000.00'),
+        }
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время кодирования JSON стандартным рендерером DRF и быстрыми рендерерами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000, help='Количество товаров в списке')
+        parser.add_argument('--orders', type=int, default=2000, help='Количество заказов в истории')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов замера')
+
+    def handle(self, *args, **options):
+        datasets = {
+            'products': make_product_list(options['products']),
+            'order history': make_order_history(options['orders']),
+        }
+        renderers = [('json (DRF)', JSONRenderer()), ('ujson', UJSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson', ORJSONRenderer()))
+
+        for dataset_name, data in datasets.items():
+            self.stdout.write(f'{dataset_name} ({len(data)} записей):')
+            baseline = None
+            for renderer_name, renderer in renderers:
+                best = min(timeit.repeat(lambda: renderer.render(data), number=1, repeat=options['repeat']))
+                baseline = baseline or best
+                self.stdout.write(f'  {renderer_name:<12} {best * 1000:8.1f} мс  x{baseline / best:.2f}')
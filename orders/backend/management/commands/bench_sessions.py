@@ -0,0 +1,82 @@
+# backend/management/commands/bench_sessions.py
+
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from backend.cart import forget_basket
+from backend.models import Category, Product, ProductInfo, Shop, User
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность эндпоинта корзины при разных хранилищах сессий '
+            '(SESSION_ENGINES в settings.py). Данные создаются в транзакции и откатываются, '
+            'ключи кэша пишутся с отдельным префиксом и удаляются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Количество запросов на каждое хранилище')
+        parser.add_argument('--storage', nargs='*', choices=sorted(settings.SESSION_ENGINES),
+                            default=list(settings.SESSION_ENGINES), help='Какие хранилища сравнить')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            with transaction.atomic():
+                self.run(options)
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+
+    def run(self, options):
+        user = User.objects.create_user('bench-sessions@example.com', 'password', username='bench-sessions')
+        shop = Shop.objects.create(name='bench-sessions')
+        product = Product.objects.create(name='bench-sessions', category=Category.objects.create(name='bench'))
+        product_info = ProductInfo.objects.create(product=product, shop=shop, external_id=1,
+                                                  quantity=10 ** 6, price=100, price_rrc=120)
+
+        self.stdout.write(f'{options["requests"]} запросов GET+POST /api/v1/basket/ на хранилище:')
+        for storage in options['storage']:
+            # Кэш общий с приложением (сессии, токены, корзины), поэтому не очищаем его, а начинаем
+            # с пустого пространства ключей: новый префикс на каждое хранилище
+            bench_cache = {**settings.CACHES['default'], 'KEY_PREFIX': f'bench-sessions:{uuid.uuid4().hex}'}
+            with override_settings(SESSION_ENGINE=settings.SESSION_ENGINES[storage],
+                                   CACHES={**settings.CACHES, 'default': bench_cache}):
+                client = Client()
+                client.force_login(user)
+                try:
+                    elapsed, queries, session_queries = self.bench(client, product_info.id, options['requests'])
+                finally:
+                    self.forget(client, user)
+            self.stdout.write(
+                f'  {storage:<15} {options["requests"] / elapsed:8.0f} запр/с  '
+                f'{queries / options["requests"]:5.1f} SQL/запрос, из них к сессиям '
+                f'{session_queries / options["requests"]:4.1f}'
+            )
+
+    def forget(self, client, user):
+        """Удаляет из кэша ключи замера: сессию и ID корзины"""
+        session = client.session
+        if hasattr(session, 'cache_key'):
+            cache.delete(session.cache_key)
+        forget_basket(user.pk)
+
+    def bench(self, client, product_info_id, count):
+        queries = session_queries = 0
+        start = time.perf_counter()
+        for i in range(count):
+            with CaptureQueriesContext(connection) as captured:
+                if i % 2:
+                    response = client.post('/api/v1/basket/', {'product_info_id': product_info_id, 'quantity': 1})
+                else:
+                    response = client.get('/api/v1/basket/')
+            if response.status_code not in (200, 201):
+                raise CommandError(f'{response.status_code}: {response.content[:200]}')
+            queries += len(captured)
+            session_queries += sum('django_session' in query['sql'] for query in captured)
+        return time.perf_counter() - start, queries, session_queries
@@ -0,0 +1,91 @@
+# backend/management/commands/loadtest.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from backend import loadtest
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест: заполняет БД покупателями, магазинами (импорт сгенерированных прайс-листов), '
+            'корзинами и заказами, затем параллельно выполняет сценарии покупателя '
+            '(просмотр → поиск → корзина → оформление) в процессе или против запущенного сервера (--base-url) '
+            'и выводит запросы/с, задержки p50/p95/p99 и долю ошибок по каждому эндпоинту.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Заполнить БД перед прогоном')
+        parser.add_argument('--users', type=int, default=50, help='Покупателей при заполнении')
+        parser.add_argument('--shops', type=int, default=5, help='Магазинов при заполнении')
+        parser.add_argument('--products', type=int, default=200, help='Товаров в прайс-листе каждого магазина')
+        parser.add_argument('--baskets', type=int, default=10, help='Покупателей с заполненной корзиной')
+        parser.add_argument('--orders', type=int, default=10, help='Покупателей с оформленным заказом')
+        parser.add_argument('--concurrency', type=int, default=10, help='Одновременных виртуальных покупателей')
+        parser.add_argument('--duration', type=float, help='Длительность прогона, сек.')
+        parser.add_argument('--iterations', type=int, help='Сценариев на каждого покупателя (если нет --duration)')
+        parser.add_argument('--weights', default=','.join(f'{k}={v}' for k, v in loadtest.DEFAULT_WEIGHTS.items()),
+                            help='Веса сценариев, например browse=50,search=25,basket=15,checkout=5,history=5')
+        parser.add_argument('--replay', help='Вместо сценариев выполнять запросы из .http-файла '
+                                             '(например, requests_example.http)')
+        parser.add_argument('--base-url', help='Адрес запущенного сервера, например http://localhost:8000; '
+                                               'без него запросы выполняются в процессе через тестовый клиент')
+        parser.add_argument('--cleanup', action='store_true', help='Удалить тестовые данные после прогона')
+
+    def handle(self, *args, **options):
+        weights = self.parse_weights(options['weights'])
+        if options['duration'] is None and options['iterations'] is None:
+            options['iterations'] = 10
+
+        if options['seed']:
+            loadtest.seed(options['users'], options['shops'], options['products'],
+                          options['baskets'], options['orders'], log=self.stdout.write)
+
+        replay = loadtest.parse_http_file(options['replay']) if options['replay'] else None
+        if options['base_url']:
+            def make_transport(token):
+                return loadtest.HTTPTransport(options['base_url'], token)
+        else:
+            # Тестовый клиент требует тестового окружения (ALLOWED_HOSTS, testserver)
+            setup_test_environment()
+            make_transport = loadtest.InProcessTransport
+
+        try:
+            recorder, elapsed = loadtest.run(make_transport, weights, options['concurrency'],
+                                             options['duration'], options['iterations'], replay)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        finally:
+            if not options['base_url']:
+                teardown_test_environment()
+            if options['cleanup']:
+                self.stdout.write(f'Удалено тестовых покупателей: {loadtest.cleanup()}')
+
+        self.report(recorder, elapsed)
+
+    def parse_weights(self, value):
+        weights = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            if name.strip() not in loadtest.DEFAULT_WEIGHTS:
+                raise CommandError(f'Неизвестный сценарий: {name.strip()}')
+            try:
+                weights[name.strip()] = int(weight)
+            except ValueError:
+                raise CommandError(f'Вес сценария {name.strip()} должен быть целым числом')
+        if not any(weights.values()):
+            raise CommandError('Хотя бы один сценарий должен иметь ненулевой вес')
+        return weights
+
+    def report(self, recorder, elapsed):
+        total = sum(result.requests for result in recorder.results.values())
+        errors = sum(result.errors for result in recorder.results.values())
+        self.stdout.write(f'Запросов: {total} за {elapsed:.1f} с ({total / elapsed:.0f} запр/с), '
+                          f'ошибок: {errors} ({errors / total * 100 if total else 0:.1f}%)')
+        self.stdout.write(f'{"эндпоинт":32} {"запросов":>8} {"запр/с":>8} {"p50 мс":>8} {"p95 мс":>8} '
+                          f'{"p99 мс":>8} {"ошибок":>7}  статусы')
+        for endpoint, result in sorted(recorder.results.items()):
+            result.elapsed = elapsed
+            self.stdout.write(
+                f'{endpoint:32} {result.requests:8} {result.rps:8.0f} {result.percentile(50) * 1000:8.1f} '
+                f'{result.percentile(95) * 1000:8.1f} {result.percentile(99) * 1000:8.1f} '
+                f'{result.errors / result.requests * 100:6.1f}%  {result.statuses}'
+            )
@@ -0,0 +1,17 @@
+# backend/management/commands/refresh_catalog_stats.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.catalog_stats import refresh_catalog_stats
+from backend.models import CategoryStats, ShopStats
+
+
+class Command(BaseCommand):
+    help = ('Полностью пересчитывает сводки магазинов и категорий (ShopStats, CategoryStats). '
+            'Обычно их обновляет импорт прайса; команда нужна после ручных правок каталога.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            refresh_catalog_stats()
+        self.stdout.write(f'Магазинов: {ShopStats.objects.count()}, категорий: {CategoryStats.objects.count()}')
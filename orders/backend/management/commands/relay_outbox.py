@@ -0,0 +1,28 @@
+# backend/management/commands/relay_outbox.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.outbox import relay_outbox
+
+
+class Command(BaseCommand):
+    help = 'Публикует события из outbox в Celery пачками (в цикле или один раз).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Событий за одну пачку')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза между пустыми проходами, сек.')
+        parser.add_argument('--once', action='store_true', help='Опубликовать накопившиеся события и выйти')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            published = relay_outbox(options['batch_size'])
+            total += published
+            if not published:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Опубликовано событий: {total}'))
@@ -0,0 +1,104 @@
+# backend/metrics.py
+
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Границы корзин гистограммы длительности запроса, сек.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ViewStats:
+    __slots__ = ('count', 'duration', 'db_queries', 'db_time', 'serialize_time', 'app_time', 'response_bytes',
+                 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.app_time = 0.0
+        self.response_bytes = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+class MetricsRegistry:
+    """
+    Метрики запросов текущего процесса, сгруппированные по (имя URL, метод, статус).
+    Каждый процесс-воркер отдаёт свои значения; суммирует их Prometheus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(_ViewStats)
+
+    def observe(self, view, method, status, duration, db_queries, db_time, serialize_time, response_bytes):
+        with self._lock:
+            stats = self._stats[(view, method, status)]
+            stats.count += 1
+            stats.duration += duration
+            stats.db_queries += db_queries
+            stats.db_time += db_time
+            stats.serialize_time += serialize_time
+            stats.app_time += max(duration - db_time - serialize_time, 0.0)
+            stats.response_bytes += response_bytes
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats.buckets[i] += 1
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus"""
+        with self._lock:
+            items = sorted(self._stats.items())
+            lines = [
+                '# HELP http_request_duration_seconds Время обработки запроса.',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            for key, stats in items:
+                labels = _labels(*key)
+                for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats.duration:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+            counters = (
+                ('http_request_db_queries_total', 'Количество SQL-запросов.', 'db_queries', '{}'),
+                ('http_request_db_seconds_total', 'Время выполнения SQL-запросов.', 'db_time', '{:.6f}'),
+                ('http_request_serialize_seconds_total', 'Время сериализации ответа (рендерер DRF).',
+                 'serialize_time', '{:.6f}'),
+                ('http_request_app_seconds_total',
+                 'Время Python-кода (view, сериализаторы, middleware) без SQL и рендеринга.',
+                 'app_time', '{:.6f}'),
+                ('http_response_bytes_total', 'Размер тел ответов.', 'response_bytes', '{}'),
+            )
+            for name, help_text, attr, value_format in counters:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for key, stats in items:
+                    lines.append(f'{name}{{{_labels(*key)}}} {value_format.format(getattr(stats, attr))}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(view, method, status):
+    view = view.replace('\\', '\\\\').replace('"', '\\"')
+    return f'view="{view}",method="{method}",status="{status}"'
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    """
+    Метрики для Prometheus. Доступны только с адресов из PERFORMANCE_METRICS_ALLOWED_IPS.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.PERFORMANCE_METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,10 +1,197 @@
 # backend/middleware.py
 
+import cProfile
+import hashlib
+import logging
+import os
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
 from django.utils.deprecation import MiddlewareMixin
 from django.middleware.csrf import CsrfViewMiddleware
+from .db_routers import use_primary
+from .metrics import registry
+
+performance_logger = logging.getLogger('backend.performance')
+
 
 class DisableCSRFForAPIMiddleware(MiddlewareMixin):
     def process_request(self, request):
         # Пропускаем CSRF-проверку только для API-эндпоинтов
         if request.path.startswith('/api/v1/'):
-            setattr(request, '_dont_enforce_csrf_checks', True)
\ No newline at end of file
+            setattr(request, '_dont_enforce_csrf_checks', True)
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Read-your-writes для чтения с реплик.
+    Изменяющие запросы целиком выполняются на основной БД и закрепляют клиента за ней
+    на REPLICA_PIN_SECONDS секунд, пока реплика не догонит запись:
+    - cookie — для браузеров (сессия);
+    - запись в общем кэше по хэшу заголовка Authorization — для API-клиентов с токеном,
+      которые обычно не хранят cookie. Аутентификация выполняется позже, во view, поэтому
+      ключом служат учётные данные запроса, а не пользователь.
+    """
+    cookie_name = 'use_primary_db'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+    # Работает и под WSGI, и под ASGI (async-представления из backend/async_views.py)
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _pin_key(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return 'replica-pin:' + hashlib.sha256(authorization.encode()).hexdigest()
+
+    def _is_write(self, request):
+        return request.method not in self.safe_methods
+
+    def _set_pin(self, request, response):
+        if self._is_write(request):
+            response.set_cookie(self.cookie_name, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        pin_key = self._pin_key(request)
+        if (self._is_write(request) or self.cookie_name in request.COOKIES
+                or (pin_key is not None and cache.get(pin_key) is not None)):
+            with use_primary():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        if pin_key is not None and self._is_write(request):
+            cache.set(pin_key, 1, settings.REPLICA_PIN_SECONDS)
+        return self._set_pin(request, response)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        pin_key = self._pin_key(request)
+        if (self._is_write(request) or self.cookie_name in request.COOKIES
+                or (pin_key is not None and await cache.aget(pin_key) is not None)):
+            with use_primary():
+                response = await self.get_response(request)
+        else:
+            response = await self.get_response(request)
+        if pin_key is not None and self._is_write(request):
+            await cache.aset(pin_key, 1, settings.REPLICA_PIN_SECONDS)
+        return self._set_pin(request, response)
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет для каждого запроса время обработки, количество и время SQL-запросов,
+    время сериализации ответа и его размер; агрегирует по имени URL (backend/metrics.py).
+    Медленные запросы (PERFORMANCE_SLOW_REQUEST_SECONDS) пишутся в лог вместе с самыми долгими SQL,
+    доля запросов PERFORMANCE_PROFILE_SAMPLE_RATE профилируется cProfile в PERFORMANCE_PROFILE_DIR.
+    Под ASGI cProfile не включается: в потоке event loop выполняются и другие запросы.
+    """
+    # Стоит первым в MIDDLEWARE: синхронная версия перевела бы под ASGI всю цепочку в поток
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profiler = None
+        if random.random() < settings.PERFORMANCE_PROFILE_SAMPLE_RATE:
+            profiler = cProfile.Profile()
+
+        queries = []
+        start = time.perf_counter()
+        with self._record_queries(request, queries):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        view = self._observe(request, response, queries, time.perf_counter() - start)
+        if profiler is not None:
+            self._dump_profile(profiler, view)
+        return response
+
+    async def __acall__(self, request):
+        queries = []
+        start = time.perf_counter()
+        # Соединения с БД привязаны к потоку: ORM выполняет запросы в потоке sync_to_async,
+        # отдельном для каждого запроса (ThreadSensitiveContext ASGIHandler), там же ставим и снимаем обёртку
+        stack = await sync_to_async(self._record_queries)(request, queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self._observe(request, response, queries, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def _record_queries(request, queries):
+        """Включает запись SQL-запросов всех БД в queries как (время, sql); close() стека выключает её"""
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((time.perf_counter() - start, sql))
+
+        request._serialize_time = 0.0
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(record_query))
+            return stack.pop_all()
+
+    @staticmethod
+    def _observe(request, response, queries, duration):
+        """Пишет метрики запроса и лог медленного запроса; возвращает имя URL"""
+        view = request.resolver_match.view_name if request.resolver_match else '<unresolved>'
+        db_time = sum(query_time for query_time, _ in queries)
+        response_bytes = 0 if response.streaming else len(response.content)
+        registry.observe(view, request.method, response.status_code, duration,
+                         len(queries), db_time, request._serialize_time, response_bytes)
+
+        if duration >= settings.PERFORMANCE_SLOW_REQUEST_SECONDS:
+            top_queries = sorted(queries, key=lambda query: query[0], reverse=True)[:5]
+            performance_logger.warning(
+                'Slow request %s %s (%s): %.3fs, %s queries in %.3fs, serialize %.3fs, %s bytes\n%s',
+                request.method, request.get_full_path(), view, duration, len(queries), db_time,
+                request._serialize_time, response_bytes,
+                '\n'.join(f'  {query_time:.3f}s {sql[:500]}' for query_time, sql in top_queries),
+            )
+        return view
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после всех middleware; рендерим здесь, чтобы замерить сериализацию
+        start = time.perf_counter()
+        response.render()
+        request._serialize_time += time.perf_counter() - start
+        return response
+
+    @staticmethod
+    def _dump_profile(profiler, view):
+        os.makedirs(settings.PERFORMANCE_PROFILE_DIR, exist_ok=True)
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{view.replace(":", "_")}-{os.getpid()}-{random.randrange(10 ** 6)}.prof'
+        profiler.dump_stats(os.path.join(settings.PERFORMANCE_PROFILE_DIR, name))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:09
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_baskets(apps, schema_editor):
+    """Оставляет у пользователя одну (самую раннюю) корзину, перенося в неё позиции из остальных"""
+    Order = apps.get_model('backend', 'Order')
+    OrderItem = apps.get_model('backend', 'OrderItem')
+
+    duplicated_users = (Order.objects.filter(state='basket').values('user_id')
+                        .annotate(baskets=Count('id')).filter(baskets__gt=1).values_list('user_id', flat=True))
+    for user_id in duplicated_users:
+        basket_ids = list(Order.objects.filter(user_id=user_id, state='basket').order_by('id').values_list('id', flat=True))
+        main_id, duplicate_ids = basket_ids[0], basket_ids[1:]
+        for duplicate_id in duplicate_ids:
+            present = OrderItem.objects.filter(order_id=main_id).values_list('product_info_id', flat=True)
+            OrderItem.objects.filter(order_id=duplicate_id).exclude(product_info_id__in=list(present)).update(order_id=main_id)
+        Order.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0004_stockreservation'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_baskets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('state', 'basket')), fields=('user',), name='unique_user_basket'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:09
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+
+
+def snapshot_placed_orders(apps, schema_editor):
+    """Фиксирует текущие цены в позициях уже оформленных заказов и считает их суммы"""
+    Order = apps.get_model('backend', 'Order')
+    OrderItem = apps.get_model('backend', 'OrderItem')
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+
+    OrderItem.objects.exclude(order__state='basket').update(
+        price=Subquery(ProductInfo.objects.filter(id=OuterRef('product_info_id')).values('price')[:1])
+    )
+    Order.objects.exclude(state='basket').update(
+        total=Subquery(
+            OrderItem.objects.filter(order_id=OuterRef('id')).values('order_id')
+            .annotate(total=Sum(F('price') * F('quantity'))).values('total')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0005_unique_user_basket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Сумма заказа'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Цена на момент заказа'),
+        ),
+        migrations.RunPython(snapshot_placed_orders, migrations.RunPython.noop),
+    ]
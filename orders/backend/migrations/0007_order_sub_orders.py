@@ -0,0 +1,24 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_order_total_orderitem_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sub_orders', to='backend.order', verbose_name='Родительский заказ'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='backend.shop', verbose_name='Магазин'),
+        ),
+    ]
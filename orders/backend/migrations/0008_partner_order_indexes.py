@@ -0,0 +1,21 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0007_order_sub_orders'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['shop', '-dt', '-id'], name='order_shop_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['shop', 'state', '-dt'], name='order_shop_state_dt_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0008_partner_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parameter',
+            name='name',
+            field=models.CharField(db_index=True, max_length=40, verbose_name='Название'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(db_index=True, max_length=80, verbose_name='Название'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'state'], name='order_user_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-dt'], name='order_user_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['shop', 'external_id'], name='productinfo_shop_ext_idx'),
+        ),
+    ]
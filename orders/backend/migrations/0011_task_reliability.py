@@ -0,0 +1,52 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0010_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadLetterTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(max_length=255, verbose_name='Задача')),
+                ('task_id', models.CharField(max_length=255, verbose_name='ID выполнения')),
+                ('args', models.JSONField(default=list, verbose_name='Аргументы')),
+                ('kwargs', models.JSONField(default=dict, verbose_name='Именованные аргументы')),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, verbose_name='Ключ идемпотентности')),
+                ('exception', models.TextField(verbose_name='Ошибка')),
+                ('traceback', models.TextField(blank=True, verbose_name='Traceback')),
+                ('retries', models.PositiveSmallIntegerField(default=0, verbose_name='Повторов')),
+                ('failed_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата ошибки')),
+                ('replayed_at', models.DateTimeField(blank=True, null=True, verbose_name='Перезапущена')),
+            ],
+            options={
+                'verbose_name': 'Неудавшаяся задача',
+                'verbose_name_plural': 'Неудавшиеся задачи',
+                'ordering': ('-failed_at',),
+            },
+        ),
+        migrations.CreateModel(
+            name='TaskExecution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='Ключ идемпотентности')),
+                ('task_name', models.CharField(max_length=255, verbose_name='Задача')),
+                ('task_id', models.CharField(blank=True, max_length=255, verbose_name='ID выполнения')),
+                ('status', models.CharField(choices=[('started', 'Выполняется'), ('succeeded', 'Выполнена'), ('failed', 'Ошибка')], default='started', max_length=10, verbose_name='Статус')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Результат')),
+                ('started_at', models.DateTimeField(verbose_name='Начало')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание')),
+            ],
+            options={
+                'verbose_name': 'Выполнение задачи',
+                'verbose_name_plural': 'Выполнения задач',
+                'ordering': ('-started_at',),
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0012_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='confirmemailtoken',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='When was this token generated'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+
+def fill_catalog_stats(apps, schema_editor):
+    """Считает сводки по уже загруженному каталогу"""
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+    ShopStats = apps.get_model('backend', 'ShopStats')
+    CategoryStats = apps.get_model('backend', 'CategoryStats')
+    now = timezone.now()
+
+    ShopStats.objects.bulk_create([
+        ShopStats(shop_id=row['shop_id'], products_count=row['products'], categories_count=row['categories'],
+                  min_price=row['min_price'], max_price=row['max_price'], updated_at=now)
+        for row in ProductInfo.objects.values('shop_id').annotate(
+            products=Count('id'), categories=Count('product__category_id', distinct=True),
+            min_price=Min('price'), max_price=Max('price'))
+    ])
+    CategoryStats.objects.bulk_create([
+        CategoryStats(category_id=row['product__category_id'], products_count=row['products'],
+                      shops_count=row['shops'], min_price=row['min_price'], max_price=row['max_price'],
+                      updated_at=now)
+        for row in ProductInfo.objects.values('product__category_id').annotate(
+            products=Count('product_id', distinct=True), shops=Count('shop_id', distinct=True),
+            min_price=Min('price'), max_price=Max('price'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0013_confirmemailtoken_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='backend.category', verbose_name='Категория')),
+                ('products_count', models.PositiveIntegerField(default=0, verbose_name='Товаров')),
+                ('shops_count', models.PositiveIntegerField(default=0, verbose_name='Магазинов')),
+                ('min_price', models.PositiveIntegerField(blank=True, null=True, verbose_name='Минимальная цена')),
+                ('max_price', models.PositiveIntegerField(blank=True, null=True, verbose_name='Максимальная цена')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Сводка по категории',
+                'verbose_name_plural': 'Сводки по категориям',
+            },
+        ),
+        migrations.CreateModel(
+            name='ShopStats',
+            fields=[
+                ('shop', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='backend.shop', verbose_name='Магазин')),
+                ('products_count', models.PositiveIntegerField(default=0, verbose_name='Товаров')),
+                ('categories_count', models.PositiveIntegerField(default=0, verbose_name='Категорий')),
+                ('min_price', models.PositiveIntegerField(blank=True, null=True, verbose_name='Минимальная цена')),
+                ('max_price', models.PositiveIntegerField(blank=True, null=True, verbose_name='Максимальная цена')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Сводка по магазину',
+                'verbose_name_plural': 'Сводки по магазинам',
+            },
+        ),
+        migrations.RunPython(fill_catalog_stats, migrations.RunPython.noop),
+    ]
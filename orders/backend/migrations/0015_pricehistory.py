@@ -0,0 +1,47 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def record_current_prices(apps, schema_editor):
+    """Начальная точка истории — текущие цены и остатки всех позиций"""
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+    PriceHistory = apps.get_model('backend', 'PriceHistory')
+    now = timezone.now()
+    rows = ProductInfo.objects.values_list('id', 'shop_id', 'price', 'price_rrc', 'quantity').iterator(chunk_size=2000)
+    PriceHistory.objects.bulk_create(
+        (PriceHistory(product_info_id=product_info_id, shop_id=shop_id, ts=now,
+                      price=price, price_rrc=price_rrc, quantity=quantity)
+         for product_info_id, shop_id, price, price_rrc, quantity in rows),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0014_catalog_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ts', models.DateTimeField(verbose_name='Время')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('price_rrc', models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('product_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='backend.productinfo', verbose_name='Информация о продукте')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'История цены',
+                'verbose_name_plural': 'История цен',
+                'indexes': [models.Index(fields=['product_info', 'ts'], name='pricehistory_product_ts_idx'), models.Index(fields=['shop', 'ts'], name='pricehistory_shop_ts_idx')],
+            },
+        ),
+        migrations.RunPython(record_current_prices, migrations.RunPython.noop),
+    ]
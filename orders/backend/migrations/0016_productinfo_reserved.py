@@ -0,0 +1,34 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:42
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def move_reservations_to_reserved(apps, schema_editor):
+    """Резервы раньше вычитались из quantity: возвращаем их в quantity и учитываем в reserved"""
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+    StockReservation = apps.get_model('backend', 'StockReservation')
+    totals = StockReservation.objects.values('product_info_id').annotate(total=Sum('quantity'))
+    for row in totals.values_list('product_info_id', 'total'):
+        ProductInfo.objects.filter(id=row[0]).update(quantity=F('quantity') + row[1], reserved=row[1])
+
+
+def move_reserved_to_quantity(apps, schema_editor):
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+    ProductInfo.objects.filter(reserved__gt=0).update(quantity=F('quantity') - F('reserved'), reserved=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0015_pricehistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinfo',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, verbose_name='Зарезервировано'),
+        ),
+        migrations.RunPython(move_reservations_to_reserved, move_reserved_to_quantity),
+    ]
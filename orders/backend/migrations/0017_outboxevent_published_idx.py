@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0016_productinfo_reserved'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(condition=models.Q(('published_at__isnull', False)), fields=['published_at'], name='outbox_published_idx'),
+        ),
+    ]
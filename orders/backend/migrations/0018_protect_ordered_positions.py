@@ -0,0 +1,24 @@
+# Generated by Django 5.2.11 on 2026-10-19 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0017_outboxevent_published_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product_info',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.PROTECT, related_name='ordered_items', to='backend.productinfo', verbose_name='Информация о продукте'),
+        ),
+        migrations.AlterField(
+            model_name='pricehistory',
+            name='product_info',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='price_history', to='backend.productinfo', verbose_name='Информация о продукте'),
+        ),
+    ]
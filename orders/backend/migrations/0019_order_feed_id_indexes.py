@@ -0,0 +1,29 @@
+# Generated by Django 5.2.11 on 2026-10-19 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0018_protect_ordered_positions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_shop_dt_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_shop_state_dt_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['shop', '-id'], name='order_shop_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['shop', 'state', '-id'], name='order_shop_state_id_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:05
+
+from django.db import migrations
+
+# Поиск товаров (ProductListView, ?search=) — product__name__icontains, в PostgreSQL это
+# UPPER(name) LIKE UPPER('%...%'). B-tree по name такой запрос не обслуживает, нужен
+# триграммный GIN-индекс по тому же выражению. В SQLite аналога нет, там миграция ничего не делает.
+INDEX_NAME = 'product_name_upper_trgm_idx'
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON backend_product USING gin (UPPER(name) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0019_order_feed_id_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0020_product_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinfo',
+            name='delisted',
+            field=models.BooleanField(default=False, verbose_name='Снята с продажи'),
+        ),
+    ]
@@ -1,9 +1,13 @@
 # backend/models.py
 
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_rest_passwordreset.tokens import get_token_generator
 
@@ -131,7 +135,9 @@ class Category(models.Model):
 
 
 class Product(models.Model):
-    name = models.CharField(max_length=80, verbose_name='Название')
+    # B-tree — для точного поиска по названию при импорте (get_or_create(name=...)).
+    # Поиск ?search= (icontains) в PostgreSQL обслуживает триграммный индекс из миграции 0020
+    name = models.CharField(max_length=80, verbose_name='Название', db_index=True)
     category = models.ForeignKey(Category, verbose_name='Категория', related_name='products', blank=True,
                                  on_delete=models.CASCADE)
 
@@ -152,8 +158,14 @@ class ProductInfo(models.Model):
     shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='product_infos', blank=True,
                              on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    # Зарезервировано корзинами (StockReservation). Импорт перезаписывает только quantity,
+    # поэтому доступно к покупке quantity - reserved
+    reserved = models.PositiveIntegerField(verbose_name='Зарезервировано', default=0)
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    # Позиция пропала из прайса, но есть в оформленных заказах, поэтому не удалена
+    # (см. utils.remove_stale_positions). В каталог, выгрузку и сводки не попадает
+    delisted = models.BooleanField(verbose_name='Снята с продажи', default=False)
 
     class Meta:
         verbose_name = 'Информация о продукте'
@@ -161,10 +173,75 @@ class ProductInfo(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
         ]
+        indexes = [
+            # Импорт прайса ищет позиции магазина по внешнему ИД
+            models.Index(fields=['shop', 'external_id'], name='productinfo_shop_ext_idx'),
+        ]
+
+
+class PriceHistory(models.Model):
+    """
+    История цен и остатков позиций магазина. Только добавление: импорт прайса пишет строку,
+    когда у позиции появилась новая цена, РРЦ или количество (или позиция появилась впервые).
+    """
+    # История переживает удаление позиции (снятие с продажи), поэтому без FK-ограничения и каскада
+    product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте',
+                                     related_name='price_history', on_delete=models.DO_NOTHING,
+                                     db_constraint=False)
+    # Денормализовано из product_info, чтобы выборка по магазину шла по индексу (shop, ts) без join-а
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='price_history', on_delete=models.CASCADE)
+    ts = models.DateTimeField(verbose_name='Время')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'История цены'
+        verbose_name_plural = 'История цен'
+        indexes = [
+            models.Index(fields=['product_info', 'ts'], name='pricehistory_product_ts_idx'),
+            models.Index(fields=['shop', 'ts'], name='pricehistory_shop_ts_idx'),
+        ]
+
+
+class ShopStats(models.Model):
+    """
+    Сводка по магазину для навигации: количество товаров и категорий, диапазон цен.
+    Пересчитывается импортом прайса (см. backend/catalog_stats.py), а не GROUP BY на каждый запрос.
+    """
+    shop = models.OneToOneField(Shop, primary_key=True, related_name='stats', verbose_name='Магазин',
+                                on_delete=models.CASCADE)
+    products_count = models.PositiveIntegerField(default=0, verbose_name='Товаров')
+    categories_count = models.PositiveIntegerField(default=0, verbose_name='Категорий')
+    min_price = models.PositiveIntegerField(null=True, blank=True, verbose_name='Минимальная цена')
+    max_price = models.PositiveIntegerField(null=True, blank=True, verbose_name='Максимальная цена')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Пересчитано')
+
+    class Meta:
+        verbose_name = 'Сводка по магазину'
+        verbose_name_plural = 'Сводки по магазинам'
+
+
+class CategoryStats(models.Model):
+    """
+    Сводка по категории для навигации: количество товаров и магазинов, диапазон цен.
+    Пересчитывается импортом прайса (см. backend/catalog_stats.py).
+    """
+    category = models.OneToOneField(Category, primary_key=True, related_name='stats', verbose_name='Категория',
+                                    on_delete=models.CASCADE)
+    products_count = models.PositiveIntegerField(default=0, verbose_name='Товаров')
+    shops_count = models.PositiveIntegerField(default=0, verbose_name='Магазинов')
+    min_price = models.PositiveIntegerField(null=True, blank=True, verbose_name='Минимальная цена')
+    max_price = models.PositiveIntegerField(null=True, blank=True, verbose_name='Максимальная цена')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Пересчитано')
+
+    class Meta:
+        verbose_name = 'Сводка по категории'
+        verbose_name_plural = 'Сводки по категориям'
 
 
 class Parameter(models.Model):
-    name = models.CharField(max_length=40, verbose_name='Название')
+    name = models.CharField(max_length=40, verbose_name='Название', db_index=True)
 
     class Meta:
         verbose_name = 'Имя параметра'
@@ -221,11 +298,32 @@ class Order(models.Model):
     contact = models.ForeignKey(Contact, verbose_name='Контакт',
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
+    total = models.PositiveIntegerField(verbose_name='Сумма заказа', blank=True, null=True)
+    # Оформленный заказ разбивается на подзаказы по магазинам
+    parent = models.ForeignKey('self', verbose_name='Родительский заказ',
+                               related_name='sub_orders', blank=True, null=True,
+                               on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин',
+                             related_name='orders', blank=True, null=True,
+                             on_delete=models.CASCADE)
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказов" # Исправлено с "Список заказ"
         ordering = ('-dt',)
+        constraints = [
+            # У пользователя может быть только одна корзина
+            models.UniqueConstraint(fields=['user'], condition=models.Q(state='basket'), name='unique_user_basket'),
+        ]
+        indexes = [
+            # Корзина и заказы пользователя по статусу
+            models.Index(fields=['user', 'state'], name='order_user_state_idx'),
+            # История заказов пользователя
+            models.Index(fields=['user', '-dt'], name='order_user_dt_idx'),
+            # Лента заказов магазина: фильтр по shop (и state) и keyset-пагинация по id
+            models.Index(fields=['shop', '-id'], name='order_shop_id_idx'),
+            models.Index(fields=['shop', 'state', '-id'], name='order_shop_state_id_idx'),
+        ]
 
     def __str__(self):
         return str(self.dt)
@@ -235,13 +333,20 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, verbose_name='Заказ', related_name='ordered_items', blank=True,
                               on_delete=models.CASCADE)
 
+    # Позицию, которую уже заказывали, удалить нельзя: импорт снимает её с продажи (delisted).
+    # Поэтому удаление магазина, категории или продукта с заказанными позициями вызывает ProtectedError:
+    # админка показывает список защищённых заказов и ничего не удаляет, loadtest.cleanup такие магазины оставляет
     product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', related_name='ordered_items',
                                      blank=True,
-                                     on_delete=models.CASCADE)
+                                     on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена на момент заказа', blank=True, null=True)
 
     def get_total_price(self):
-        # Цена за единицу берется из связанной информации о продукте
+        # У оформленного заказа цена зафиксирована в позиции
+        if self.price is not None:
+            return self.quantity * self.price
+        # Для корзины цена за единицу берется из связанной информации о продукте
         # Проверяем, что product_info и price существуют
         if self.product_info and hasattr(self.product_info, 'price'):
             return self.quantity * self.product_info.price
@@ -254,6 +359,24 @@ class OrderItem(models.Model):
             models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item'),
         ]
 
+
+class StockReservation(models.Model):
+    """Временный резерв товара под позицию корзины"""
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='reservations',
+                              on_delete=models.CASCADE)
+    product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', related_name='reservations',
+                                     on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    expires_at = models.DateTimeField(verbose_name='Резерв действует до', db_index=True)
+
+    class Meta:
+        verbose_name = 'Резерв товара'
+        verbose_name_plural = 'Резервы товаров'
+
+    def __str__(self):
+        return f'{self.product_info_id} x {self.quantity} до {self.expires_at}'
+
+
 class ConfirmEmailToken(models.Model):
     class Meta:
         verbose_name = 'Токен подтверждения Email'
@@ -264,6 +387,11 @@ class ConfirmEmailToken(models.Model):
         """ generates a pseudo random code using os.urandom and binascii.hexlify """
         return get_token_generator().generate_token()
 
+    @staticmethod
+    def valid_since():
+        """Токены, созданные раньше этого момента, просрочены (CONFIRM_EMAIL_TOKEN_TTL)"""
+        return timezone.now() - timedelta(seconds=settings.CONFIRM_EMAIL_TOKEN_TTL)
+
     user = models.ForeignKey(
         User,
         related_name='confirm_email_tokens',
@@ -273,6 +401,7 @@ class ConfirmEmailToken(models.Model):
 
     created_at = models.DateTimeField(
         auto_now_add=True,
+        db_index=True,
         verbose_name=_("When was this token generated")
     )
 
@@ -308,4 +437,112 @@ class ImportTask(models.Model):
         ordering = ('-uploaded_at',)
 
     def __str__(self):
-        return f"Импорт от {self.uploaded_at.strftime('%d.%m.%Y %H:%M')}"
\ No newline at end of file
+        return f"Импорт от {self.uploaded_at.strftime('%d.%m.%Y %H:%M')}"
+
+
+EMAIL_STATUS_CHOICES = (
+    ('pending', 'Ожидает отправки'),
+    ('sent', 'Отправлено'),
+    ('failed', 'Не удалось отправить'),
+)
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди на отправку (см. backend/mail.py)"""
+    to_email = models.EmailField(verbose_name='Получатель')
+    subject = models.CharField(max_length=255, verbose_name='Тема')
+    body = models.TextField(verbose_name='Текст')
+    status = models.CharField(verbose_name='Статус', choices=EMAIL_STATUS_CHOICES, max_length=10, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток отправки')
+    next_attempt_at = models.DateTimeField(verbose_name='Следующая попытка')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено')
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        ordering = ('-created_at',)
+        indexes = [
+            # Выборка очередной пачки в flush_outgoing_emails
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoingemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} → {self.to_email}'
+
+
+TASK_EXECUTION_STATUS_CHOICES = (
+    ('started', 'Выполняется'),
+    ('succeeded', 'Выполнена'),
+    ('failed', 'Ошибка'),
+)
+
+
+class TaskExecution(models.Model):
+    """Выполнение задачи Celery по ключу идемпотентности (см. backend/task_base.py)"""
+    key = models.CharField(max_length=255, unique=True, verbose_name='Ключ идемпотентности')
+    task_name = models.CharField(max_length=255, verbose_name='Задача')
+    task_id = models.CharField(max_length=255, blank=True, verbose_name='ID выполнения')
+    status = models.CharField(verbose_name='Статус', choices=TASK_EXECUTION_STATUS_CHOICES,
+                              max_length=10, default='started')
+    result = models.JSONField(null=True, blank=True, verbose_name='Результат')
+    started_at = models.DateTimeField(verbose_name='Начало')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Окончание')
+
+    class Meta:
+        verbose_name = 'Выполнение задачи'
+        verbose_name_plural = 'Выполнения задач'
+        ordering = ('-started_at',)
+
+    def __str__(self):
+        return f'{self.key} ({self.status})'
+
+
+class DeadLetterTask(models.Model):
+    """Задача Celery, которая не выполнилась после всех повторов"""
+    task_name = models.CharField(max_length=255, verbose_name='Задача')
+    task_id = models.CharField(max_length=255, verbose_name='ID выполнения')
+    args = models.JSONField(default=list, verbose_name='Аргументы')
+    kwargs = models.JSONField(default=dict, verbose_name='Именованные аргументы')
+    idempotency_key = models.CharField(max_length=255, blank=True, verbose_name='Ключ идемпотентности')
+    exception = models.TextField(verbose_name='Ошибка')
+    traceback = models.TextField(blank=True, verbose_name='Traceback')
+    retries = models.PositiveSmallIntegerField(default=0, verbose_name='Повторов')
+    failed_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата ошибки')
+    replayed_at = models.DateTimeField(null=True, blank=True, verbose_name='Перезапущена')
+
+    class Meta:
+        verbose_name = 'Неудавшаяся задача'
+        verbose_name_plural = 'Неудавшиеся задачи'
+        ordering = ('-failed_at',)
+
+    def __str__(self):
+        return f'{self.task_name}[{self.task_id}]'
+
+
+class OutboxEvent(models.Model):
+    """
+    Событие для публикации в Celery. Пишется в одной транзакции с изменением данных,
+    публикуется relay-процессом (см. backend/outbox.py).
+    """
+    task_name = models.CharField(max_length=255, verbose_name='Задача')
+    args = models.JSONField(default=list, verbose_name='Аргументы')
+    kwargs = models.JSONField(default=dict, verbose_name='Именованные аргументы')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    published_at = models.DateTimeField(null=True, blank=True, verbose_name='Опубликовано')
+
+    class Meta:
+        verbose_name = 'Событие outbox'
+        verbose_name_plural = 'События outbox'
+        ordering = ('-created_at',)
+        indexes = [
+            # Очередь неопубликованных событий остаётся маленькой, даже когда таблица большая
+            models.Index(fields=['id'], condition=models.Q(published_at__isnull=True), name='outbox_pending_idx'),
+            # Для удаления опубликованных событий по сроку хранения
+            models.Index(fields=['published_at'], condition=models.Q(published_at__isnull=False),
+                         name='outbox_published_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task_name} #{self.id}'
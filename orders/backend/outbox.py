@@ -0,0 +1,70 @@
+# backend/outbox.py
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .celery import app
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def publish_event(task_name, *args, **kwargs):
+    """
+    Записывает задачу в outbox. Вызывается внутри транзакции, изменяющей данные:
+    если транзакция откатится, задача не будет отправлена, а запрос не ждёт брокер.
+    """
+    return OutboxEvent.objects.create(task_name=task_name, args=list(args), kwargs=kwargs)
+
+
+def relay_outbox(batch_size=None):
+    """
+    Публикует неотправленные события пачкой через одно соединение с брокером.
+    Доставка «хотя бы один раз»: если процесс упадёт после отправки, но до отметки published_at,
+    событие уйдёт повторно, поэтому задача получает ключ идемпотентности outbox:<id>.
+
+    :return: количество опубликованных событий
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        events = list(OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+            published_at__isnull=True
+        ).order_by('id')[:batch_size])
+        if not events:
+            return 0
+
+        published = []
+        try:
+            with app.producer_or_acquire() as producer:
+                for event in events:
+                    app.send_task(event.task_name, args=event.args, kwargs=event.kwargs, producer=producer,
+                                  headers={'idempotency_key': f'outbox:{event.id}'}, ignore_result=True)
+                    published.append(event.id)
+        except Exception as e:
+            # Отмечаем то, что успели отправить; остальное уйдёт при следующем запуске
+            logger.warning('Outbox relay stopped after %s of %s events: %s', len(published), len(events), e)
+        OutboxEvent.objects.filter(id__in=published).update(published_at=timezone.now())
+    return len(published)
+
+
+def purge_published(batch_size=1000, max_batches=100):
+    """
+    Удаляет опубликованные события старше OUTBOX_RETENTION пачками по batch_size.
+    Неопубликованные события не удаляются независимо от возраста.
+
+    :return: количество удалённых событий
+    """
+    deleted = 0
+    published_before = timezone.now() - timedelta(seconds=settings.OUTBOX_RETENTION)
+    for _ in range(max_batches):
+        ids = list(OutboxEvent.objects.filter(
+            published_at__lt=published_before
+        ).order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += OutboxEvent.objects.filter(id__in=ids).delete()[0]
+    return deleted
@@ -0,0 +1,28 @@
+# backend/pagination.py
+
+from rest_framework.pagination import CursorPagination
+
+
+class PartnerOrderCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация ленты заказов магазина по Order.id.
+    Следующая страница выбирается условием id < курсора, а не OFFSET,
+    поэтому время ответа не растёт с номером страницы.
+    CursorPagination строит курсор только по первому полю сортировки, а совпадения добирает смещением;
+    у подзаказов одного заказа dt общий, поэтому сортировка по уникальному id, а не по dt
+    (dt = время создания, порядок по id с ним совпадает).
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class PriceHistoryCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация истории цен по времени: страницы читаются по индексам (product_info, ts) и (shop, ts).
+    """
+    ordering = ('-ts', '-id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,46 @@
+# backend/parsers.py
+
+import math
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.settings import api_settings
+import ujson
+
+from .renderers import UJSONRenderer
+
+
+class UJSONParser(JSONParser):
+    """
+    Парсер JSON-тела запроса на базе ujson.
+    ujson принимает NaN/Infinity и превращает 1e400 в inf; как и JSONParser со STRICT_JSON,
+    такие значения отклоняются с ParseError, чтобы не попасть в сериализаторы.
+    """
+    renderer_class = UJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        try:
+            data = ujson.loads(stream.read().decode(encoding))
+            if api_settings.STRICT_JSON:
+                _check_finite(data)
+            return data
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+def _check_finite(data):
+    """ValueError, если в разобранном JSON есть NaN или бесконечность"""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                raise ValueError(f'Out of range float values are not JSON compliant: {value!r}')
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
@@ -0,0 +1,13 @@
+# backend/permissions.py
+
+from rest_framework.permissions import BasePermission
+
+
+class IsShopUser(BasePermission):
+    """
+    Доступ только для пользователей-магазинов (User.type == 'shop').
+    """
+    message = 'Только для магазинов'
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and request.user.type == 'shop')
@@ -0,0 +1,36 @@
+# backend/price_history.py
+
+from django.utils import timezone
+
+from .models import PriceHistory, ProductInfo
+
+# История пишется как разница между состоянием позиций магазина до и после импорта:
+# до импорта — снимок одним запросом, после — ещё один запрос и один bulk insert изменившихся строк.
+
+TRACKED_FIELDS = ('price', 'price_rrc', 'quantity')
+
+
+def snapshot(shop_id):
+    """Текущие цены и остатки позиций магазина: {product_info_id: (price, price_rrc, quantity)}"""
+    return {
+        row[0]: row[1:]
+        for row in ProductInfo.objects.filter(shop_id=shop_id).values_list('id', *TRACKED_FIELDS)
+    }
+
+
+def record_changes(shop_id, before, ts=None):
+    """
+    Добавляет в PriceHistory позиции магазина, которые появились или изменились по сравнению со снимком before.
+
+    :param before: результат snapshot() до импорта
+    :return: количество записанных строк
+    """
+    ts = ts or timezone.now()
+    changes = [
+        PriceHistory(product_info_id=product_info_id, shop_id=shop_id, ts=ts,
+                     price=values[0], price_rrc=values[1], quantity=values[2])
+        for product_info_id, values in snapshot(shop_id).items()
+        if before.get(product_info_id) != values
+    ]
+    PriceHistory.objects.bulk_create(changes, batch_size=1000)
+    return len(changes)
@@ -0,0 +1,68 @@
+# backend/renderers.py
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+import ujson
+
+try:
+    import orjson
+except ImportError:  # orjson — необязательная зависимость
+    orjson = None
+
+
+def ujson_dumps(data, indent=None, ensure_ascii=False):
+    """
+    Сериализует данные через ujson.
+    Типы, которые ujson не умеет кодировать сам (datetime, Decimal, lazy-строки,
+    QuerySet и т.д.), передаются стандартному энкодеру DRF, поэтому формат
+    вывода совпадает с rest_framework.renderers.JSONRenderer.
+    """
+    return ujson.dumps(
+        data,
+        ensure_ascii=ensure_ascii,
+        escape_forward_slashes=False,
+        indent=indent or 0,
+        default=encoders.JSONEncoder().default,
+    )
+
+
+class UJSONRenderer(JSONRenderer):
+    """
+    Быстрый JSON-рендерер на базе ujson.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+
+        ret = ujson_dumps(data, indent=indent, ensure_ascii=self.ensure_ascii)
+
+        # Как и в JSONRenderer, экранируем \u2028 и \u2029
+        ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return ret.encode()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON-рендерер на базе orjson (если библиотека установлена).
+    datetime отдаются энкодеру DRF, чтобы формат дат совпадал с остальными рендерерами.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            raise RuntimeError('Для ORJSONRenderer требуется пакет orjson')
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+
+        ret = orjson.dumps(data, default=encoders.JSONEncoder().default, option=option)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
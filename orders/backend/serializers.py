@@ -2,7 +2,8 @@
 
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, Contact
+from .models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, Contact, \
+    ConfirmEmailToken, ShopStats, CategoryStats, PriceHistory
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -47,6 +48,24 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
+class ConfirmEmailSerializer(serializers.Serializer):
+    """
+    Сериализатор для подтверждения email по токену из письма.
+    """
+    email = serializers.EmailField()
+    token = serializers.CharField(max_length=64)
+
+    def validate(self, attrs):
+        # Один запрос по уникальному индексу key; просроченные токены не подходят
+        token = ConfirmEmailToken.objects.select_related('user').filter(
+            key=attrs['token'], user__email=attrs['email'], created_at__gte=ConfirmEmailToken.valid_since()
+        ).first()
+        if token is None:
+            raise serializers.ValidationError('Неверный или просроченный токен.')
+        attrs['user'] = token.user
+        return attrs
+
+
 class ParameterSerializer(serializers.ModelSerializer):
     class Meta:
         model = Parameter
@@ -74,6 +93,41 @@ class ShopSerializer(serializers.ModelSerializer):
         fields = ('name',)
 
 
+class ShopStatsSerializer(serializers.ModelSerializer):
+    """
+    Магазин со сводкой для навигации (ShopStats).
+    """
+    id = serializers.IntegerField(source='shop_id')
+    name = serializers.CharField(source='shop.name')
+    state = serializers.BooleanField(source='shop.state')
+
+    class Meta:
+        model = ShopStats
+        fields = ('id', 'name', 'state', 'products_count', 'categories_count', 'min_price', 'max_price')
+
+
+class CategoryStatsSerializer(serializers.ModelSerializer):
+    """
+    Категория со сводкой для навигации (CategoryStats).
+    """
+    id = serializers.IntegerField(source='category_id')
+    name = serializers.CharField(source='category.name')
+
+    class Meta:
+        model = CategoryStats
+        fields = ('id', 'name', 'products_count', 'shops_count', 'min_price', 'max_price')
+
+
+class PriceHistorySerializer(serializers.ModelSerializer):
+    """
+    Точка истории цены и остатка позиции магазина.
+    """
+
+    class Meta:
+        model = PriceHistory
+        fields = ('product_info_id', 'shop_id', 'ts', 'price', 'price_rrc', 'quantity')
+
+
 class ProductInfoSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     shop = ShopSerializer(read_only=True)
@@ -93,6 +147,32 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ('id', 'product_info', 'quantity', 'total_price')
 
 
+class CartBatchItemSerializer(serializers.Serializer):
+    product_info_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Сериализатор для пакетного добавления товаров в корзину.
+    """
+    max_items = 500
+    items = CartBatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        if len(value) > self.max_items:
+            raise serializers.ValidationError(f'Не более {self.max_items} позиций за запрос.')
+        return value
+
+    def get_lines(self):
+        # Повторяющиеся позиции суммируем
+        lines = {}
+        for item in self.validated_data['items']:
+            product_info_id = item['product_info_id']
+            lines[product_info_id] = lines.get(product_info_id, 0) + item['quantity']
+        return lines
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product_info = ProductInfoSerializer(read_only=True)
     total_price = serializers.ReadOnlyField(source='get_total_price')
@@ -137,15 +217,40 @@ class OrderConfirmationSerializer(serializers.Serializer):
         return contact
 
 
-class OrderHistorySerializer(serializers.ModelSerializer):
+class PartnerOrderSerializer(serializers.ModelSerializer):
+    """
+    Подзаказ в ленте заказов магазина.
+    """
+    order_id = serializers.IntegerField(source='parent_id', read_only=True)
+    contact = AddContactSerializer(read_only=True)
     ordered_items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'order_id', 'dt', 'state', 'total', 'contact', 'ordered_items')
+
+
+class OrderHistorySerializer(serializers.ModelSerializer):
+    ordered_items = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
         fields = ('id', 'dt', 'state', 'ordered_items', 'total_price')
 
+    def get_ordered_items(self, obj):
+        # Позиции оформленного заказа лежат в его подзаказах по магазинам
+        sub_orders = obj.sub_orders.all()
+        if sub_orders:
+            items = [item for sub_order in sub_orders for item in sub_order.ordered_items.all()]
+        else:
+            items = obj.ordered_items.all()
+        return OrderItemSerializer(items, many=True, context=self.context).data
+
     def get_total_price(self, obj):
+        # Сумма оформленного заказа хранится в самом заказе
+        if obj.total is not None:
+            return obj.total
         # Рассчитываем общую стоимость заказа
         total = sum(item.get_total_price() for item in obj.ordered_items.all())
         return total
@@ -0,0 +1,41 @@
+# backend/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_tokens
+from .cart import release_reservations
+from .catalog_stats import refresh_category_stats, shop_category_ids
+from .models import Order, Shop, StockReservation, User
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, **kwargs):
+    """Пользователь изменён (например, деактивирован) — закэшированные по токену данные устарели."""
+    forget_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(pre_delete, sender=Order)
+def release_order_reservations(sender, instance, **kwargs):
+    """Резервы удаляемого заказа (в том числе при каскадном удалении) снимаются до того, как их удалит каскад."""
+    release_reservations(StockReservation.objects.filter(order_id=instance.id))
+
+
+@receiver(pre_save, sender=Shop)
+def remember_shop_state(sender, instance, **kwargs):
+    """Запоминает, изменился ли статус магазина: от него зависят сводки категорий."""
+    stored = Shop.objects.filter(pk=instance.pk).values_list('state', flat=True).first() if instance.pk else None
+    instance._state_changed = stored is not None and stored != instance.state
+
+
+@receiver(post_save, sender=Shop)
+def refresh_shop_category_stats(sender, instance, **kwargs):
+    """Магазин включил или выключил приём заказов — пересчитываются сводки его категорий."""
+    if getattr(instance, '_state_changed', False):
+        refresh_category_stats(shop_category_ids(instance.id))
@@ -0,0 +1,113 @@
+# backend/task_base.py
+
+import logging
+import traceback
+from datetime import timedelta
+
+from celery import Task
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DeadLetterTask, TaskExecution
+
+logger = logging.getLogger(__name__)
+
+# Через сколько незавершённое выполнение с тем же ключом считается брошенным (воркер упал), сек.
+EXECUTION_LEASE = 15 * 60
+
+
+class ReliableTask(Task):
+    """
+    Базовый класс задач Celery:
+    - автоматические повторы с экспоненциальной задержкой и jitter при любых ошибках,
+      кроме заведомо постоянных (объект не найден, неверные данные);
+    - идемпотентность: если у задачи задан idempotency_key, выполнение с тем же ключом
+      происходит один раз. Ключ закрепляется и отметка об успехе пишется короткими отдельными транзакциями,
+      а транзакции самого тела задача открывает сама — так блокировка записи не держится всё выполнение;
+    - после исчерпания повторов задача попадает в DeadLetterTask, откуда её можно перезапустить из админки.
+
+    Ключ задаётся функцией от аргументов задачи:
+        @shared_task(base=ReliableTask, idempotency_key=lambda order_id: f'order-email:{order_id}')
+    или заголовком сообщения: task.apply_async(args, headers={'idempotency_key': '...'}).
+    """
+    autoretry_for = (Exception,)
+    dont_autoretry_for = (ObjectDoesNotExist, ValueError, KeyError)
+    max_retries = 5
+    retry_backoff = 2
+    retry_backoff_max = 10 * 60
+    retry_jitter = True
+
+    idempotency_key = None
+
+    def get_idempotency_key(self, args, kwargs):
+        # Заголовок приходит атрибутом запроса у воркера и в request.headers при eager-выполнении
+        key = getattr(self.request, 'idempotency_key', None) or (self.request.headers or {}).get('idempotency_key')
+        # Функция из опций декоратора хранится атрибутом класса задачи, берём её без привязки к экземпляру
+        key_func = type(self).idempotency_key
+        if key is None and key_func is not None:
+            key = key_func(*args, **kwargs)
+        return key
+
+    def __call__(self, *args, **kwargs):
+        if self.request.called_directly:
+            # Обычный вызов функции вне воркера — без повторов и учёта выполнений
+            return super().__call__(*args, **kwargs)
+
+        # Воркер уже поместил контекст запроса в стек, поэтому вызываем run() напрямую:
+        # Task.__call__ подменил бы его пустым контекстом, и retry() не сработал бы
+        key = self.get_idempotency_key(args, kwargs)
+        if key is None:
+            return self.run(*args, **kwargs)
+
+        execution = self._claim_execution(key)
+        if execution is None:
+            logger.info('Task %s with key %s is already running', self.name, key)
+            return None
+        if execution.status == 'succeeded':
+            logger.info('Task %s with key %s already succeeded, skipping', self.name, key)
+            return execution.result
+
+        result = self.run(*args, **kwargs)
+        TaskExecution.objects.filter(id=execution.id).update(
+            status='succeeded', result=result, finished_at=timezone.now())
+        return result
+
+    def _claim_execution(self, key):
+        """
+        Закрепляет ключ за текущим выполнением.
+        :return: TaskExecution; None, если с тем же ключом сейчас выполняется другая задача
+        """
+        task_id = self.request.id or ''
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                return TaskExecution.objects.create(key=key, task_name=self.name, task_id=task_id, started_at=now)
+        except IntegrityError:
+            pass
+
+        claimed = TaskExecution.objects.filter(key=key).exclude(status='succeeded').filter(
+            Q(task_id=task_id) | Q(status='failed') | Q(started_at__lt=now - timedelta(seconds=EXECUTION_LEASE))
+        ).update(status='started', task_id=task_id, started_at=now)
+        execution = TaskExecution.objects.get(key=key)
+        if claimed or execution.status == 'succeeded':
+            return execution
+        return None
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        key = self.get_idempotency_key(args, kwargs)
+        if key is not None:
+            TaskExecution.objects.filter(key=key, task_id=task_id).update(
+                status='failed', finished_at=timezone.now())
+        DeadLetterTask.objects.create(
+            task_name=self.name,
+            task_id=task_id,
+            args=list(args),
+            kwargs=kwargs,
+            idempotency_key=key or '',
+            exception=repr(exc),
+            traceback=str(einfo) if einfo else traceback.format_exc(),
+            retries=self.request.retries,
+        )
+        logger.error('Task %s[%s] moved to dead letter: %r', self.name, task_id, exc)
@@ -1,18 +1,29 @@
 # backend/tasks.py
 
 from celery import shared_task  # <-- В начало файла
-from django.core.mail import send_mail
+from celery.exceptions import SoftTimeLimitExceeded
 from django.conf import settings
-from .models import Order, User, ConfirmEmailToken, ImportTask
+from django.db import transaction
+from django.utils import timezone
+from .models import Order, User, ConfirmEmailToken, ImportTask, StockReservation
+from .db_routers import use_primary
+from .task_base import ReliableTask
+from .mail import queue_email, flush_outgoing_emails as flush_email_queue
 import yaml
 
 
-@shared_task  # <-- Добавь этот декоратор
+@shared_task(base=ReliableTask, idempotency_key=lambda user_email, user_id=None: f'registration-email:{user_id}')
+@transaction.atomic
 def send_registration_confirmation_email(user_email, user_id=None):
     """
-    Отправляет письмо для подтверждения регистрации.
+    Ставит в очередь письмо для подтверждения регистрации.
+    При повторном выполнении используется уже выданный пользователю действующий токен.
     """
-    token_instance = ConfirmEmailToken.objects.create(user_id=user_id)
+    token_instance = ConfirmEmailToken.objects.filter(
+        user_id=user_id, created_at__gte=ConfirmEmailToken.valid_since()
+    ).order_by('-created_at').first()
+    if token_instance is None:
+        token_instance = ConfirmEmailToken.objects.create(user_id=user_id)
     token_key = token_instance.key
 
     subject = 'Подтверждение регистрации на сайте'
@@ -24,92 +35,54 @@ def send_registration_confirmation_email(user_email, user_id=None):
     С уважением, Администрация сайта.
     """
 
-    try:
-        send_mail(
-            subject,
-            message_body_text,
-            settings.DEFAULT_FROM_EMAIL,
-            [user_email],
-            fail_silently=False,
-        )
-        print(f"[CELERY] Email sent to {user_email}")
-        return True
-    except Exception as e:
-        print(f"[CELERY] Email failed: {e}")
-        return False
-
-
-@shared_task  # <-- Добавь этот декоратор
+    queue_email(subject, message_body_text, user_email)
+    print(f"[CELERY] Email queued for {user_email}")
+    return True
+
+
+@shared_task(base=ReliableTask, idempotency_key=lambda order_id, contact_id: f'order-email:{order_id}')
+@transaction.atomic
 def send_order_confirmation_email(order_id, contact_id):
     """
-    Отправляет письмо с подтверждением заказа.
+    Ставит в очередь письмо с подтверждением заказа.
+    """
+    order = Order.objects.select_related('user').get(id=order_id)
+    subject = f'Подтверждение заказа #{order.id}'
+    message_body_text = f"""
+    Ваш заказ #{order.id} подтвержден.
+    Статус: {order.get_state_display()}.
     """
-    try:
-        order = Order.objects.get(id=order_id)
-        subject = f'Подтверждение заказа #{order.id}'
-        message_body_text = f"""
-        Ваш заказ #{order.id} подтвержден.
-        Статус: {order.get_state_display()}.
-        """
-        send_mail(
-            subject,
-            message_body_text,
-            settings.DEFAULT_FROM_EMAIL,
-            [order.user.email],
-            fail_silently=False,
-        )
-        print(f"[CELERY] Order email sent for order {order_id}")
-        return True
-    except Order.DoesNotExist:
-        print(f"[CELERY] Order {order_id} not found")
-        return False
-    except Exception as e:
-        print(f"[CELERY] Order email failed: {e}")
-        return False
-
-
-@shared_task  # <-- Добавь этот декоратор
+    queue_email(subject, message_body_text, order.user.email)
+    print(f"[CELERY] Order email queued for order {order_id}")
+    return True
+
+
+@shared_task
+def flush_outgoing_emails(batch_size=None):
+    """Отправляет очередь писем пачками через одно SMTP-соединение"""
+    sent, failed = flush_email_queue(batch_size)
+    if sent or failed:
+        print(f"[CELERY] Emails sent: {sent}, failed: {failed}")
+    return sent
+
+
+@shared_task(base=ReliableTask, idempotency_key=lambda import_task_id: f'import:{import_task_id}',
+             dont_autoretry_for=ReliableTask.dont_autoretry_for + (yaml.YAMLError, SoftTimeLimitExceeded),
+             soft_time_limit=settings.IMPORT_TASK_SOFT_TIME_LIMIT, time_limit=settings.IMPORT_TASK_TIME_LIMIT)
+@use_primary()
 def do_import(import_task_id):
-    """Асинхронный импорт товаров из YAML"""
-    from .models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
-
-    try:
-        import_task = ImportTask.objects.get(id=import_task_id)
-        data = yaml.safe_load(import_task.yaml_file.read().decode('utf-8'))
-
-        stats = {'products': 0, 'categories': 0, 'parameters': 0}
-        shop_name = data.get('shop', 'Default Shop')
-        shop, _ = Shop.objects.get_or_create(name=shop_name)
-
-        # Импорт категорий
-        for cat_data in data.get('categories', []):
-            Category.objects.get_or_create(id=cat_data['id'], defaults={'name': cat_data['name']})
-            stats['categories'] += 1
-
-        # Импорт товаров
-        for good in data.get('goods', []):
-            category = Category.objects.get(id=good['category'])
-            product, _ = Product.objects.get_or_create(name=good['name'], defaults={'category': category})
-
-            ProductInfo.objects.update_or_create(
-                external_id=good['id'],
-                shop=shop,
-                defaults={
-                    'product': product,
-                    'quantity': good.get('quantity', 0),
-                    'price': good.get('price', 0),
-                }
-            )
-            stats['products'] += 1
-
-            for param_name, param_value in good.get('parameters', {}).items():
-                parameter, _ = Parameter.objects.get_or_create(name=param_name)
-                ProductParameter.objects.update_or_create(
-                    product_info=ProductInfo.objects.get(external_id=good['id'], shop=shop),
-                    parameter=parameter,
-                    defaults={'value': str(param_value)}
-                )
-                stats['parameters'] += 1
+    """
+    Асинхронный импорт товаров из YAML тем же кодом, что и load_data (utils.import_price_list).
+    YAML разбирается до начала транзакции, а запись в БД выполняется в одной транзакции,
+    поэтому повтор после ошибки начинается с чистого состояния.
+    """
+    from .utils import import_price_list
+
+    import_task = ImportTask.objects.get(id=import_task_id)
+    data = yaml.safe_load(import_task.yaml_file.read().decode('utf-8'))
+
+    with transaction.atomic():
+        stats = import_price_list(data)
 
         import_task.is_processed = True
         import_task.products_count = stats['products']
@@ -117,9 +90,55 @@ def do_import(import_task_id):
         import_task.parameters_count = stats['parameters']
         import_task.save()
 
-        print(f"[CELERY] Import completed: {stats}")
-        return stats
-
-    except Exception as e:
-        print(f"[CELERY] Import failed: {e}")
-        return False
\ No newline at end of file
+    print(f"[CELERY] Import completed: {stats}")
+    return stats
+
+
+@shared_task
+def release_expired_reservations(batch_size=1000):
+    """Снимает просроченные резервы корзин, освобождая зарезервированный товар"""
+    from .cart import release_reservations
+
+    expired_ids = list(StockReservation.objects.filter(
+        expires_at__lte=timezone.now()
+    ).values_list('id', flat=True)[:batch_size])
+    released = release_reservations(StockReservation.objects.filter(id__in=expired_ids))
+    print(f"[CELERY] Released {released} expired reservations")
+    return released
+
+
+@shared_task
+def relay_outbox(batch_size=None):
+    """Публикует события из outbox (см. backend/outbox.py)"""
+    from .outbox import relay_outbox as relay
+
+    published = relay(batch_size)
+    if published:
+        print(f"[CELERY] Outbox events published: {published}")
+    return published
+
+
+@shared_task
+def purge_published_outbox_events(batch_size=1000, max_batches=100):
+    """Удаляет опубликованные события outbox старше OUTBOX_RETENTION (см. backend/outbox.py)"""
+    from .outbox import purge_published
+
+    deleted = purge_published(batch_size, max_batches)
+    print(f"[CELERY] Purged {deleted} published outbox events")
+    return deleted
+
+
+@shared_task
+def purge_expired_confirm_tokens(batch_size=1000, max_batches=100):
+    """Удаляет просроченные токены подтверждения email пачками по batch_size"""
+    deleted = 0
+    valid_since = ConfirmEmailToken.valid_since()
+    for _ in range(max_batches):
+        expired_ids = list(ConfirmEmailToken.objects.filter(
+            created_at__lt=valid_since
+        ).values_list('id', flat=True)[:batch_size])
+        if not expired_ids:
+            break
+        deleted += ConfirmEmailToken.objects.filter(id__in=expired_ids).delete()[0]
+    print(f"[CELERY] Purged {deleted} expired confirmation tokens")
+    return deleted
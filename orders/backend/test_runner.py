@@ -0,0 +1,22 @@
+# backend/test_runner.py
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class LocalCacheTestRunner(DiscoverRunner):
+    """
+    Запускает тесты на локальном кэше в памяти, даже если задан CACHE_URL:
+    тестам не нужен Redis, а cache.clear() в тестах не затрагивает общий кэш.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._local_cache = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        })
+        self._local_cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._local_cache.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1084 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import re
+from base64 import b64decode, b64encode
+from datetime import timedelta
+from decimal import Decimal
+from smtplib import SMTPRecipientsRefused
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed, ParseError
+from rest_framework.renderers import JSONRenderer
+
+from .models import (
+    User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter,
+    Order, OrderItem, Contact, ConfirmEmailToken, StockReservation, OutgoingEmail,
+    TaskExecution, DeadLetterTask, OutboxEvent, PriceHistory, ImportTask, ShopStats
+)
+from .authentication import CachedTokenAuthentication
+from .cart import (
+    InsufficientStockError, StaleBasketError, add_many_to_cart, add_to_cart, get_basket_id, remove_cart_items,
+    reserve_stock
+)
+from .celery import app as celery_app
+from .checkout import CheckoutError, place_order
+from .db_routers import ReplicaRouter, use_primary
+from .utils import load_data, sync_shop_categories
+from .export import iter_product_rows
+from . import loadtest
+from .mail import flush_outgoing_emails, queue_email
+from .metrics import registry
+from .outbox import publish_event, purge_published, relay_outbox
+from .tasks import (
+    do_import, purge_expired_confirm_tokens, release_expired_reservations, send_order_confirmation_email,
+    send_registration_confirmation_email
+)
+from .middleware import ReplicaStickinessMiddleware
+from .parsers import UJSONParser
+from .renderers import ORJSONRenderer, UJSONRenderer, orjson
+
+
+class JSONRendererParserTests(SimpleTestCase):
+    """Быстрые рендереры отдают то же, что JSONRenderer, парсер отклоняет то же, что JSONParser."""
+
+    data = {
+        'dt': timezone.make_aware(timezone.datetime(2024, 3, 1, 12, 30, 15, 123456)),
+        'date': timezone.datetime(2024, 3, 1).date(),
+        'price': Decimal('10.50'),
+        'status': gettext_lazy('Подтвержден'),
+        'text': 'строка\u2028с\u2029разделителями / и слэшем',
+        'items': [1, 2.5, None, True],
+    }
+
+    def test_ujson_matches_json_renderer(self):
+        self.assertEqual(UJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_orjson_matches_json_renderer(self):
+        if orjson is None:
+            self.skipTest('orjson не установлен')
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_parser(self):
+        self.assertEqual(UJSONParser().parse(io.BytesIO('{"a": [1, "б"]}'.encode())), {'a': [1, 'б']})
+
+    def test_malformed_and_non_finite_input_is_rejected(self):
+        for body in (b'{"a": ', b'{"a": NaN}', b'[Infinity]', b'{"a": [1e400]}'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                UJSONParser().parse(io.BytesIO(body))
+
+    def test_malformed_body_is_400(self):
+        response = self.client.post('/api/v1/login/', '{"email": NaN}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductExportTests(TestCase):
+    """Каталог выгружается потоком в NDJSON и CSV пачками фиксированного числа запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Смартфоны')
+        other_category = Category.objects.create(name='Аксессуары')
+        cls.shop = Shop.objects.create(name='Связной')
+        other_shop = Shop.objects.create(name='Евросеть')
+        color = Parameter.objects.create(name='Цвет')
+        cls.product_infos = []
+        for i in range(5):
+            product = Product.objects.create(name=f'Смартфон {i}', category=category if i < 4 else other_category)
+            product_info = ProductInfo.objects.create(product=product, shop=cls.shop if i < 3 else other_shop,
+                                                      external_id=i, model=f'model/{i}',
+                                                      quantity=i + 1, price=100 + i, price_rrc=120)
+            ProductParameter.objects.create(product_info=product_info, parameter=color, value='черный')
+            cls.product_infos.append(product_info)
+
+    def export(self, **params):
+        response = self.client.get('/api/v1/products/export/', params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.ndjson"')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [product_info.id for product_info in self.product_infos])
+        self.assertEqual(rows[0], {
+            'id': self.product_infos[0].id, 'external_id': 0, 'product': 'Смартфон 0',
+            'category_id': self.product_infos[0].product.category_id, 'shop_id': self.shop.id, 'shop': 'Связной',
+            'model': 'model/0', 'price': 100, 'price_rrc': 120, 'quantity': 1, 'parameters': {'Цвет': 'черный'},
+        })
+
+    def test_csv(self):
+        response, body = self.export(output='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:3], ['id', 'external_id', 'product'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(json.loads(rows[1][-1]), {'Цвет': 'черный'})
+
+    def test_filters(self):
+        _, body = self.export(shop_id=self.shop.id, category_id=self.product_infos[0].product.category_id)
+        self.assertEqual(len(body.splitlines()), 3)
+        _, body = self.export(category_id=self.product_infos[4].product.category_id)
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [self.product_infos[4].id])
+
+    def test_invalid_params(self):
+        for params in ({'shop_id': 'abc'}, {'category_id': '1.5'}, {'output': 'xml'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/v1/products/export/', params).status_code, 400)
+
+    def test_chunked_iteration(self):
+        # Пачка по 2: 3 пачки, на каждую один запрос параметров; ProductInfo читается одним курсором
+        with self.assertNumQueries(4):
+            rows = list(iter_product_rows(chunk_size=2))
+        self.assertEqual([row['id'] for row in rows], [product_info.id for product_info in self.product_infos])
+        self.assertTrue(all(row['parameters'] == {'Цвет': 'черный'} for row in rows))
+
+
+@override_settings(CART_RESERVATION_TTL=900)
+class StockReservationTests(TestCase):
+    """Резервы учитываются в ProductInfo.reserved и не меняют остаток из прайса."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reserve@example.com', 'password', username='reserve')
+        shop = Shop.objects.create(name='Связной')
+        product = Product.objects.create(name='Смартфон', category=Category.objects.create(name='Смартфоны'))
+        self.product_info = ProductInfo.objects.create(product=product, shop=shop, external_id=1,
+                                                       quantity=5, price=100, price_rrc=120)
+        self.cart_id = get_basket_id(self.user)
+
+    def assertStock(self, quantity, reserved):
+        self.product_info.refresh_from_db()
+        self.assertEqual((self.product_info.quantity, self.product_info.reserved), (quantity, reserved))
+
+    def test_reserve(self):
+        add_to_cart(self.cart_id, self.product_info.id, 3)
+        self.assertStock(5, 3)
+        with self.assertRaises(InsufficientStockError):
+            add_to_cart(self.cart_id, self.product_info.id, 3)
+        self.assertStock(5, 3)
+
+    def test_release(self):
+        add_to_cart(self.cart_id, self.product_info.id, 3)
+        # Импорт перезаписал остаток — снятие резерва не должно прибавить к нему зарезервированное
+        ProductInfo.objects.filter(id=self.product_info.id).update(quantity=10)
+        remove_cart_items(self.cart_id, OrderItem.objects.filter(order_id=self.cart_id))
+        self.assertStock(10, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expiry(self):
+        reserve_stock(self.cart_id, self.product_info.id, 2)
+        reserve_stock(self.cart_id, self.product_info.id, 1)
+        StockReservation.objects.filter(quantity=2).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertStock(5, 1)
+
+    def test_order_delete_releases_reservations(self):
+        add_to_cart(self.cart_id, self.product_info.id, 4)
+        self.user.delete()
+        self.assertStock(5, 0)
+
+
+class CartBatchTests(TestCase):
+    """Пакетное добавление в корзину прибавляет количество в БД и проверяет остатки всех позиций."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('batch@example.com', 'password', username='batch')
+        self.client.force_login(self.user)
+        shop = Shop.objects.create(name='Связной')
+        category = Category.objects.create(name='Смартфоны')
+        self.first, self.second = (
+            ProductInfo.objects.create(product=Product.objects.create(name=name, category=category), shop=shop,
+                                       external_id=i, quantity=5, price=100, price_rrc=120)
+            for i, name in enumerate(('Смартфон', 'Чехол'), start=1)
+        )
+
+    def post(self, items):
+        return self.client.post('/api/v1/cart/batch/', {'items': items}, content_type='application/json')
+
+    def cart(self):
+        return dict(OrderItem.objects.filter(order_id=get_basket_id(self.user))
+                    .values_list('product_info_id', 'quantity'))
+
+    def test_batch(self):
+        add_to_cart(get_basket_id(self.user), self.first.id, 1)
+        response = self.post([{'product_info_id': self.first.id, 'quantity': 1},
+                              {'product_info_id': self.second.id, 'quantity': 2},
+                              {'product_info_id': self.first.id, 'quantity': 1}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.cart(), {self.first.id: 3, self.second.id: 2})
+
+    def test_repeated_batches_add_up(self):
+        cart_id = get_basket_id(self.user)
+        add_many_to_cart(cart_id, {self.first.id: 2})
+        add_many_to_cart(cart_id, {self.first.id: 2, self.second.id: 1})
+        self.assertEqual(self.cart(), {self.first.id: 4, self.second.id: 1})
+
+    def test_insufficient_stock(self):
+        add_to_cart(get_basket_id(self.user), self.first.id, 4)
+        response = self.post([{'product_info_id': self.first.id, 'quantity': 2},
+                              {'product_info_id': self.second.id, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['product_info_ids'], [self.first.id])
+        # Пакет откатился целиком
+        self.assertEqual(self.cart(), {self.first.id: 4})
+
+    def test_invalid(self):
+        response = self.post([{'product_info_id': 999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['product_info_ids'], [999])
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([{'product_info_id': self.first.id, 'quantity': 0}]).status_code, 400)
+
+
+class BasketCacheTests(TestCase):
+    """Устаревший ID корзины в кэше не приводит к записи в оформленный заказ."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('stale@example.com', 'password', username='stale')
+        self.client.force_login(self.user)
+        product = Product.objects.create(name='Смартфон', category=Category.objects.create(name='Смартфоны'))
+        self.product_info = ProductInfo.objects.create(product=product, shop=Shop.objects.create(name='Связной'),
+                                                       external_id=1, quantity=5, price=100, price_rrc=120)
+        self.stale_id = get_basket_id(self.user)
+        # Заказ оформлен в обход place_order, кэш не сброшен
+        Order.objects.filter(id=self.stale_id).update(state='confirmed')
+
+    def test_write_functions_reject_stale_id(self):
+        with self.assertRaises(StaleBasketError):
+            add_to_cart(self.stale_id, self.product_info.id, 1)
+        with self.assertRaises(StaleBasketError):
+            add_many_to_cart(self.stale_id, {self.product_info.id: 1})
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_view_retries_with_fresh_basket(self):
+        response = self.client.post('/api/v1/basket/', {'product_info_id': self.product_info.id, 'quantity': 1},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        item = OrderItem.objects.get()
+        self.assertNotEqual(item.order_id, self.stale_id)
+        self.assertEqual(item.order.state, 'basket')
+        self.assertEqual(get_basket_id(self.user), item.order_id)
+
+    def test_non_numeric_ids_are_400(self):
+        response = self.client.post('/api/v1/basket/', {'product_info_id': 'abc', 'quantity': 1},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put('/api/v1/basket/', {'order_item_id': 'abc', 'quantity': 1},
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.delete('/api/v1/basket/?order_item_id=abc').status_code, 400)
+
+
+class CheckoutTests(TestCase):
+    """Оформление заказа: списание остатков, фиксация цен, резервы и повторное оформление."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('checkout@example.com', 'password', username='checkout')
+        self.contact = Contact.objects.create(user=self.user, city='Москва', street='Тверская', phone='+79990000000')
+        shop = Shop.objects.create(name='Связной')
+        category = Category.objects.create(name='Смартфоны')
+        self.first, self.second = (
+            ProductInfo.objects.create(product=Product.objects.create(name=name, category=category), shop=shop,
+                                       external_id=i, quantity=5, price=price, price_rrc=price)
+            for i, (name, price) in enumerate((('Смартфон', 100), ('Чехол', 10)), start=1)
+        )
+        self.basket = Order.objects.get(id=get_basket_id(self.user))
+
+    def assertStock(self, product_info, quantity, reserved=0):
+        product_info.refresh_from_db()
+        self.assertEqual((product_info.quantity, product_info.reserved), (quantity, reserved))
+
+    def test_place_order(self):
+        add_many_to_cart(self.basket.id, {self.first.id: 2, self.second.id: 3})
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/orders/confirm/', {'basket_id': self.basket.id,
+                                                                     'contact_id': self.contact.id},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.basket.refresh_from_db()
+        self.assertEqual((self.basket.state, self.basket.total), ('confirmed', 230))
+        self.assertStock(self.first, 3)
+        self.assertStock(self.second, 2)
+        # Цена зафиксирована и не зависит от последующих изменений прайса
+        ProductInfo.objects.filter(id=self.first.id).update(price=1000)
+        self.assertEqual(sorted(OrderItem.objects.values_list('price', flat=True)), [10, 100])
+        # Следующий запрос к корзине получает новую
+        self.assertNotEqual(get_basket_id(self.user), self.basket.id)
+
+    def test_double_checkout(self):
+        add_to_cart(self.basket.id, self.first.id, 1)
+        place_order(self.basket, self.contact)
+        with self.assertRaises(CheckoutError):
+            place_order(self.basket, self.contact)
+        self.assertStock(self.first, 4)
+
+    def test_empty_basket(self):
+        with self.assertRaises(CheckoutError):
+            place_order(self.basket, self.contact)
+        self.assertEqual(Order.objects.get(id=self.basket.id).state, 'basket')
+
+    def test_insufficient_stock(self):
+        add_many_to_cart(self.basket.id, {self.first.id: 2, self.second.id: 4})
+        # Импорт уменьшил остаток после добавления в корзину
+        ProductInfo.objects.filter(id=self.second.id).update(quantity=3)
+        with self.assertRaises(InsufficientStockError) as raised:
+            place_order(self.basket, self.contact)
+        self.assertEqual(raised.exception.product_info_ids, [self.second.id])
+        self.assertEqual(Order.objects.get(id=self.basket.id).state, 'basket')
+        self.assertStock(self.first, 5)
+
+    @override_settings(CART_RESERVATION_TTL=900)
+    def test_reservations(self):
+        add_to_cart(self.basket.id, self.first.id, 2)
+        add_to_cart(self.basket.id, self.second.id, 1)
+        remove_cart_items(self.basket.id, OrderItem.objects.filter(product_info=self.second))
+        # Резерв без позиции в корзине (например, позицию удалили в обход remove_cart_items)
+        reserve_stock(self.basket.id, self.second.id, 2)
+        self.assertStock(self.first, 5, reserved=2)
+
+        place_order(self.basket, self.contact)
+        self.assertStock(self.first, 3)
+        self.assertStock(self.second, 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class PartnerOrderFeedTests(TestCase):
+    """Лента заказов магазина: фильтры по статусу и датам, keyset-пагинация."""
+
+    def setUp(self):
+        owner = User.objects.create_user('partner@example.com', 'password', username='partner', type='shop')
+        buyer = User.objects.create_user('buyer@example.com', 'password', username='buyer')
+        self.shop = Shop.objects.create(name='Связной', user=owner)
+        other = Shop.objects.create(name='Другой')
+        self.client.force_login(owner)
+
+        # По одному подзаказу в день с 1 по 5 марта в 12:00, статусы чередуются
+        self.orders = []
+        for day in range(1, 6):
+            order = Order.objects.create(user=buyer, shop=self.shop, state='confirmed' if day % 2 else 'sent')
+            Order.objects.filter(id=order.id).update(dt=timezone.make_aware(timezone.datetime(2024, 3, day, 12)))
+            self.orders.append(order.id)
+        Order.objects.create(user=buyer, shop=other, state='confirmed')
+
+    def feed(self, **params):
+        response = self.client.get('/api/v1/partner/orders/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_filters(self):
+        self.assertEqual([order['id'] for order in self.feed()['results']], self.orders[::-1])
+        self.assertEqual([order['id'] for order in self.feed(state='sent')['results']],
+                         [self.orders[3], self.orders[1]])
+        # Дата без времени в date_to включает весь день
+        self.assertEqual([order['id'] for order in self.feed(date_from='2024-03-02', date_to='2024-03-03')['results']],
+                         [self.orders[2], self.orders[1]])
+        self.assertEqual([order['id'] for order in self.feed(date_to='2024-03-02T11:00')['results']],
+                         [self.orders[0]])
+
+    def test_invalid_dates(self):
+        for value in ('2024-02-30', '2024-13-01T00:00', 'вчера'):
+            response = self.client.get('/api/v1/partner/orders/', {'date_to': value})
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_cursor_pagination(self):
+        page = self.feed(page_size=2)
+        seen = [order['id'] for order in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            seen += [order['id'] for order in page['results']]
+        self.assertEqual(seen, self.orders[::-1])
+
+    def test_cursor_has_no_offset_for_equal_dt(self):
+        # Подзаказы одного заказа создаются с общим dt
+        Order.objects.filter(id__in=self.orders).update(dt=timezone.now())
+        page = self.feed(page_size=2)
+        seen = [order['id'] for order in page['results']]
+        while page['next']:
+            cursor = parse_qs(urlparse(page['next']).query)['cursor'][0]
+            self.assertNotIn('o', parse_qs(b64decode(cursor).decode()))
+            page = self.client.get(page['next']).json()
+            seen += [order['id'] for order in page['results']]
+        self.assertEqual(seen, self.orders[::-1])
+
+    def test_shop_users_only(self):
+        self.client.force_login(User.objects.get(email='buyer@example.com'))
+        self.assertEqual(self.client.get('/api/v1/partner/orders/').status_code, 403)
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class HotQueryIndexTests(TestCase):
+    """
+    Проверяет по EXPLAIN, что горячие запросы из views.py, utils.py и tasks.py
+    обслуживаются индексами, а не полным просмотром таблиц.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer@example.com', 'password', username='buyer')
+        cls.shop = Shop.objects.create(name='Связной')
+
+    def assertUsesIndex(self, queryset, table):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            # SCAN без индекса — полный просмотр таблицы
+            self.assertNotRegex(plan, rf'SCAN {table}(?! USING (COVERING )?INDEX)', plan)
+            self.assertRegex(plan, rf'(SEARCH|SCAN) {table} USING', plan)
+        elif connection.vendor == 'postgresql':
+            self.assertNotRegex(plan, rf'Seq Scan on {table}\b', plan)
+        else:
+            self.assertNotRegex(plan, re.compile(r'full scan', re.IGNORECASE), plan)
+
+    def test_basket_lookup(self):
+        # get_basket_id
+        self.assertUsesIndex(Order.objects.filter(user=self.user, state='basket').values_list('id'), 'backend_order')
+
+    def test_order_history(self):
+        # OrderHistoryView
+        queryset = Order.objects.filter(user=self.user, parent__isnull=True).exclude(state='basket').order_by('-dt')
+        self.assertUsesIndex(queryset, 'backend_order')
+
+    def test_partner_order_feed(self):
+        # PartnerOrderFeedView
+        queryset = Order.objects.filter(shop=self.shop, state__in=['confirmed']).order_by('-id')[:51]
+        self.assertUsesIndex(queryset, 'backend_order')
+
+    def test_cart_items(self):
+        # CartView, cart.add_many_to_cart, checkout.place_order
+        self.assertUsesIndex(OrderItem.objects.filter(order_id=1), 'backend_orderitem')
+        self.assertUsesIndex(OrderItem.objects.filter(order_id=1, product_info_id__in=[1, 2]), 'backend_orderitem')
+
+    def test_stock_reservations(self):
+        # cart.remove_cart_items, tasks.release_expired_reservations
+        self.assertUsesIndex(StockReservation.objects.filter(order_id=1), 'backend_stockreservation')
+        self.assertUsesIndex(StockReservation.objects.filter(expires_at__lte=timezone.now()), 'backend_stockreservation')
+
+    def test_product_list_filters(self):
+        # ProductListView
+        self.assertUsesIndex(ProductInfo.objects.filter(shop_id=self.shop.id), 'backend_productinfo')
+        self.assertUsesIndex(ProductInfo.objects.filter(product__category_id=1), 'backend_product')
+
+    @skipUnless(connection.vendor == 'postgresql', 'триграммный индекс есть только в PostgreSQL')
+    def test_product_search(self):
+        # ProductListView, ?search=
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = ProductInfo.objects.filter(product__name__icontains='смарт').explain()
+        self.assertIn('product_name_upper_trgm_idx', plan)
+
+    def test_import_lookups(self):
+        # utils.load_data, tasks.do_import
+        self.assertUsesIndex(ProductInfo.objects.filter(shop=self.shop, external_id=4216292), 'backend_productinfo')
+        self.assertUsesIndex(Product.objects.filter(name='Смартфон'), 'backend_product')
+        self.assertUsesIndex(Parameter.objects.filter(name='Цвет'), 'backend_parameter')
+        self.assertUsesIndex(Category.objects.filter(id=224), 'backend_category')
+        self.assertUsesIndex(ProductParameter.objects.filter(product_info_id=1, parameter_id=1), 'backend_productparameter')
+
+    def test_contacts(self):
+        # ContactListView, DetailedContactListView
+        self.assertUsesIndex(Contact.objects.filter(user=self.user, city__icontains='Моск'), 'backend_contact')
+
+    def test_confirm_email_token(self):
+        self.assertUsesIndex(ConfirmEmailToken.objects.filter(key='abc'), 'backend_confirmemailtoken')
+        # tasks.purge_expired_confirm_tokens
+        self.assertUsesIndex(ConfirmEmailToken.objects.filter(created_at__lt=timezone.now()).values_list('id'),
+                             'backend_confirmemailtoken')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Чтения уходят на реплику, кроме изменяющих запросов, «липкого» окна после них,
+    импорта и транзакций в основной БД.
+    """
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Product), 'replica1')
+        self.assertEqual(self.router.db_for_write(Product), 'default')
+
+    def test_use_primary(self):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertEqual(self.router.db_for_read(Product), 'replica1')
+
+    def test_reads_inside_transaction_stay_on_primary(self):
+        with mock.patch.object(connection, 'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_write_request_pins_client_to_primary(self):
+        seen = []
+        middleware = ReplicaStickinessMiddleware(
+            lambda request: seen.append(ReplicaRouter().db_for_read(Product)) or HttpResponse())
+        factory = RequestFactory()
+
+        response = middleware(factory.post('/api/v1/basket/'))
+        self.assertEqual(response.cookies[ReplicaStickinessMiddleware.cookie_name]['max-age'], 5)
+
+        middleware(factory.get('/api/v1/basket/'))
+        pinned_request = factory.get('/api/v1/basket/')
+        pinned_request.COOKIES[ReplicaStickinessMiddleware.cookie_name] = '1'
+        middleware(pinned_request)
+        self.assertEqual(seen, ['default', 'replica1', 'default'])
+
+    def test_token_client_is_pinned_without_cookies(self):
+        cache.clear()
+        seen = []
+        middleware = ReplicaStickinessMiddleware(
+            lambda request: seen.append(ReplicaRouter().db_for_read(Product)) or HttpResponse())
+        factory = RequestFactory()
+
+        middleware(factory.post('/api/v1/basket/', HTTP_AUTHORIZATION='Token writer'))
+        middleware(factory.get('/api/v1/basket/', HTTP_AUTHORIZATION='Token writer'))
+        middleware(factory.get('/api/v1/basket/', HTTP_AUTHORIZATION='Token other'))
+        self.assertEqual(seen, ['default', 'default', 'replica1'])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class MailQueueTests(TestCase):
+    """Письма из очереди уходят пачкой через одно соединение, ошибки откладываются с backoff."""
+
+    def test_flush_uses_one_connection(self):
+        for i in range(3):
+            queue_email(f'Заказ #{i}', 'Текст', f'buyer{i}@example.com')
+
+        with mock.patch('backend.mail.get_connection', wraps=get_connection) as connection_factory:
+            self.assertEqual(flush_outgoing_emails(), (3, 0))
+        connection_factory.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutgoingEmail.objects.filter(status='sent').count(), 3)
+        # Повторный flush ничего не отправляет
+        self.assertEqual(flush_outgoing_emails(), (0, 0))
+
+    def test_failed_message_is_retried_later(self):
+        queue_email('Тема', 'Текст', 'ok@example.com')
+        broken = queue_email('Тема', 'Текст', 'broken@example.com')
+        send_messages = EmailBackend.send_messages
+
+        def flaky_send(backend, messages):
+            if messages[0].to == ['broken@example.com']:
+                raise SMTPRecipientsRefused({})
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', flaky_send):
+            self.assertEqual(flush_outgoing_emails(), (1, 1))
+
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.attempts), ('pending', 1))
+        self.assertGreater(broken.next_attempt_at, timezone.now())
+
+    def test_connection_failure_counts_attempts(self):
+        for i in range(2):
+            queue_email('Тема', 'Текст', f'buyer{i}@example.com')
+
+        with mock.patch.object(EmailBackend, 'open', side_effect=ConnectionRefusedError('SMTP недоступен')):
+            self.assertEqual(flush_outgoing_emails(), (0, 2))
+
+        self.assertEqual(set(OutgoingEmail.objects.values_list('status', 'attempts')), {('pending', 1)})
+        self.assertIn('SMTP недоступен', OutgoingEmail.objects.first().last_error)
+
+
+class ReliableTaskTests(TestCase):
+    """Задачи с ключом идемпотентности выполняются один раз, неудачные попадают в DeadLetterTask."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('new@example.com', 'password', username='new')
+
+    def test_registration_email_is_idempotent(self):
+        for _ in range(2):
+            send_registration_confirmation_email.apply(args=(self.user.email, self.user.id))
+        self.assertEqual(ConfirmEmailToken.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(OutgoingEmail.objects.filter(to_email=self.user.email).count(), 1)
+        self.assertEqual(TaskExecution.objects.get(key=f'registration-email:{self.user.id}').status, 'succeeded')
+
+    def test_permanent_failure_goes_to_dead_letter(self):
+        result = send_order_confirmation_email.apply(args=(404, 1))
+        self.assertTrue(result.failed())
+        dead_task = DeadLetterTask.objects.get()
+        self.assertEqual((dead_task.task_name, dead_task.args), (send_order_confirmation_email.name, [404, 1]))
+        self.assertEqual(TaskExecution.objects.get(key='order-email:404').status, 'failed')
+
+
+class OutboxTests(TestCase):
+    """События пишутся в транзакции и публикуются relay в брокер (in-memory)."""
+
+    def setUp(self):
+        # Celery читает CELERY_BROKER_URL из окружения в первую очередь
+        broker = mock.patch.dict(os.environ, {'CELERY_BROKER_URL': 'memory://'})
+        broker.start()
+        self.addCleanup(broker.stop)
+        self.addCleanup(self.reset_broker_pool)
+
+    @staticmethod
+    def reset_broker_pool():
+        if celery_app._pool is not None:
+            celery_app._pool.force_close_all()
+            celery_app._pool = None
+
+    def test_rolled_back_event_is_not_stored(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            publish_event('backend.tasks.send_order_confirmation_email', 1, 1)
+            raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_relay_publishes_pending_events(self):
+        event = publish_event('backend.tasks.send_order_confirmation_email', 7, 3)
+        with celery_app.connection_for_read() as connection:
+            queue = connection.SimpleQueue('mail', no_ack=True)
+            self.assertEqual(relay_outbox(), 1)
+            self.assertEqual(relay_outbox(), 0)
+
+            message = queue.get(timeout=1)
+            self.assertEqual(message.headers['task'], 'backend.tasks.send_order_confirmation_email')
+            self.assertEqual(message.headers['idempotency_key'], f'outbox:{event.id}')
+            self.assertEqual(message.decode()[0], [7, 3])
+            queue.close()
+
+        event.refresh_from_db()
+        self.assertIsNotNone(event.published_at)
+
+    def test_purge_keeps_pending_and_recent_events(self):
+        old, recent, pending = [publish_event('backend.tasks.send_order_confirmation_email', i, 1) for i in range(3)]
+        OutboxEvent.objects.filter(id=old.id).update(
+            published_at=timezone.now() - timedelta(seconds=settings.OUTBOX_RETENTION + 1))
+        OutboxEvent.objects.filter(id=recent.id).update(published_at=timezone.now())
+        self.assertEqual(purge_published(), 1)
+        self.assertEqual(set(OutboxEvent.objects.values_list('id', flat=True)), {recent.id, pending.id})
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Пользователь по токену берётся из кэша без запросов к БД и сбрасывается при деактивации."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('api@example.com', 'password', username='api')
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def test_cached_lookup_has_no_queries(self):
+        self.assertEqual(self.authentication.authenticate_credentials(self.token.key)[0], self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authentication.authenticate_credentials(self.token.key)[0], self.user)
+
+    def test_returns_token_and_separate_user_copies(self):
+        user, token = self.authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(token, self.token)
+        self.assertIs(token.user, user)
+        user.first_name = 'changed'
+        other_user, _ = self.authentication.authenticate_credentials(self.token.key)
+        self.assertIsNot(other_user, user)
+        self.assertEqual(other_user.first_name, '')
+
+    def test_basic_authentication_still_works(self):
+        credentials = b64encode(b'api@example.com:password').decode()
+        response = self.client.get('/api/v1/basket/', HTTP_AUTHORIZATION=f'Basic {credentials}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_login_returns_token(self):
+        response = self.client.post('/api/v1/login/', {'email': 'api@example.com', 'password': 'password'})
+        self.assertEqual(response.json()['token'], self.token.key)
+
+        response = self.client.get('/api/v1/basket/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, 200)
+
+
+class LoginTests(TestCase):
+    """Старые хэши пересчитываются при входе, перебор паролей ограничивается до хэширования."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('login@example.com', 'password', username='login')
+
+    def test_old_hash_is_upgraded_on_login(self):
+        self.user.password = make_password('password', hasher='pbkdf2_sha1')
+        self.user.save()
+
+        response = self.client.post('/api/v1/login/', {'email': 'login@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(get_hasher().algorithm + '$'))
+
+    @override_settings(LOGIN_MAX_FAILURES_PER_EMAIL=2)
+    def test_failed_attempts_are_limited(self):
+        wrong = {'email': 'login@example.com', 'password': 'wrong'}
+        for _ in range(2):
+            self.assertEqual(self.client.post('/api/v1/login/', wrong).status_code, 400)
+
+        with mock.patch('django.contrib.auth.backends.ModelBackend.authenticate') as authenticate:
+            response = self.client.post('/api/v1/login/', {'email': 'login@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 429)
+        authenticate.assert_not_called()
+
+    @override_settings(LOGIN_MAX_FAILURES_PER_IP=2)
+    def test_forwarded_for_does_not_bypass_ip_limit(self):
+        for i in range(2):
+            wrong = {'email': f'user{i}@example.com', 'password': 'wrong'}
+            self.client.post('/api/v1/login/', wrong, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}')
+        response = self.client.post('/api/v1/login/', {'email': 'login@example.com', 'password': 'password'},
+                                    HTTP_X_FORWARDED_FOR='10.0.0.99')
+        self.assertEqual(response.status_code, 429)
+
+    def test_non_object_body_is_rejected(self):
+        response = self.client.post('/api/v1/login/', '["login@example.com"]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ConfirmEmailTokenTests(TestCase):
+    """Токены подтверждения email действуют CONFIRM_EMAIL_TOKEN_TTL и удаляются пачками после истечения."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('confirm@example.com', 'password', username='confirm', is_active=False)
+
+    def test_confirm(self):
+        token = ConfirmEmailToken.objects.create(user=self.user)
+        response = self.client.post('/api/v1/register/confirm/', {'email': self.user.email, 'token': token.key})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+        self.assertFalse(ConfirmEmailToken.objects.filter(user=self.user).exists())
+
+    def test_expired_token_is_rejected_and_purged(self):
+        token = ConfirmEmailToken.objects.create(user=self.user)
+        fresh = ConfirmEmailToken.objects.create(user=self.user)
+        ConfirmEmailToken.objects.filter(id=token.id).update(
+            created_at=timezone.now() - timedelta(seconds=settings.CONFIRM_EMAIL_TOKEN_TTL + 1))
+
+        response = self.client.post('/api/v1/register/confirm/', {'email': self.user.email, 'token': token.key})
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(purge_expired_confirm_tokens(batch_size=1), 1)
+        self.assertEqual(list(ConfirmEmailToken.objects.values_list('id', flat=True)), [fresh.id])
+
+
+class AsyncViewTests(TestCase):
+    """Асинхронные эндпоинты чтения отдают то же, что синхронные."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('async@example.com', 'password', username='async')
+        self.token = Token.objects.create(user=self.user)
+        Contact.objects.create(user=self.user, city='Москва', street='Тверская', phone='+79990000000')
+
+    def test_contacts(self):
+        self.assertEqual(self.client.get('/api/v1/async/contacts/').status_code, 401)
+        auth = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        response = self.client.get('/api/v1/async/contacts/', **auth)
+        self.assertEqual(response.json(), self.client.get('/api/v1/contacts/list/', **auth).json())
+
+    def test_basket(self):
+        auth = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        response = self.client.get('/api/v1/async/basket/', **auth)
+        self.assertEqual(response.json(), self.client.get('/api/v1/basket/', **auth).json())
+
+
+class PerformanceMiddlewareTests(TestCase):
+    """Метрики запросов по имени URL, лог медленных запросов и выборочное профилирование."""
+
+    def setUp(self):
+        registry.clear()
+
+    def test_metrics(self):
+        self.client.get('/api/v1/products/')
+        metrics = self.client.get('/metrics/').content.decode()
+        labels = 'view="product-list",method="GET",status="200"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', metrics)
+        self.assertRegex(metrics, rf'http_request_db_queries_total{{{labels}}} [1-9]')
+        self.assertRegex(metrics, rf'http_response_bytes_total{{{labels}}} [1-9]')
+
+    async def test_metrics_under_asgi(self):
+        await self.async_client.get('/api/v1/async/products/')
+        metrics = (await self.async_client.get('/metrics/')).content.decode()
+        labels = 'view="async-product-list",method="GET",status="200"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', metrics)
+        self.assertRegex(metrics, rf'http_request_db_queries_total{{{labels}}} [1-9]')
+
+    def test_metrics_are_local_only(self):
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+    def test_slow_request_log_and_profile(self):
+        with TemporaryDirectory() as profile_dir, self.settings(
+                PERFORMANCE_SLOW_REQUEST_SECONDS=0, PERFORMANCE_PROFILE_SAMPLE_RATE=1,
+                PERFORMANCE_PROFILE_DIR=profile_dir):
+            with self.assertLogs('backend.performance', 'WARNING') as logs:
+                self.client.get('/api/v1/products/')
+            self.assertEqual(len(os.listdir(profile_dir)), 1)
+        self.assertIn('product-list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class LoadTestTests(TestCase):
+    """Заполнение БД для нагрузочного теста и сценарии через тестовый клиент."""
+
+    def test_seed_and_scenarios(self):
+        loadtest.seed(users=3, shops=2, products=10, baskets=1, orders=1, log=lambda message: None)
+        self.assertEqual(Shop.objects.filter(name__startswith='Loadtest shop').count(), 2)
+        self.assertEqual(ProductInfo.objects.filter(shop__name__startswith='Loadtest shop').count(), 20)
+        self.assertEqual(Order.objects.filter(user__email__startswith='loadtest-', state='confirmed')
+                         .values('user').distinct().count(), 1)
+
+        user = User.objects.get(email=loadtest.USER_EMAIL.format(2))
+        scenarios = loadtest.Scenarios(list(ProductInfo.objects.values_list('id', flat=True)),
+                                       list(Shop.objects.values_list('id', flat=True)), ['Loadtest'])
+        recorder = loadtest.Recorder()
+        transport = loadtest.InProcessTransport(user.auth_token.key)
+        scenarios.checkout(recorder, transport, {'contact_id': user.contacts.get().id})
+        scenarios.search(recorder, transport, {})
+        self.assertEqual(recorder.results['POST orders/confirm/'].statuses, {200: 1})
+        self.assertEqual(sum(result.errors for result in recorder.results.values()), 0)
+
+        loadtest.cleanup()
+        self.assertFalse(User.objects.filter(email__startswith='loadtest-').exists())
+        self.assertFalse(Shop.objects.filter(name__startswith='Loadtest shop').exists())
+        self.assertFalse(Category.objects.filter(name__startswith='Loadtest ').exists())
+
+    def test_cleanup_keeps_foreign_categories(self):
+        Category.objects.create(id=loadtest.CATEGORY_ID_BASE, name='Смартфоны')
+        loadtest.seed(users=1, shops=1, products=5, log=lambda message: None)
+        loadtest.cleanup()
+        self.assertEqual(list(Category.objects.values_list('id', flat=True)), [loadtest.CATEGORY_ID_BASE])
+
+    def test_cleanup_keeps_shops_with_foreign_orders(self):
+        loadtest.seed(users=1, shops=2, products=5, log=lambda message: None)
+        ordered = ProductInfo.objects.filter(shop__name=loadtest.SHOP_NAME.format(0)).first()
+        user = User.objects.create_user('buyer@example.com', 'password', username='buyer')
+        order = Order.objects.create(user=user, state='confirmed')
+        OrderItem.objects.create(order=order, product_info=ordered, quantity=1, price=ordered.price)
+
+        loadtest.cleanup()
+        # Магазин с позицией из чужого заказа остаётся, позиция снята с продажи; второй магазин удалён
+        self.assertEqual(list(Shop.objects.values_list('id', flat=True)), [ordered.shop_id])
+        self.assertEqual(list(ProductInfo.objects.values_list('id', 'delisted')), [(ordered.id, True)])
+        self.assertTrue(Category.objects.filter(id=ordered.product.category_id).exists())
+        self.assertEqual(list(OrderItem.objects.values_list('order_id', flat=True)), [order.id])
+
+    def test_parse_http_file(self):
+        requests = loadtest.parse_http_file(os.path.join(settings.BASE_DIR.parent, 'requests_example.http'))
+        self.assertIn(('GET', '/api/v1/products/', None), requests)
+        self.assertTrue(any(method == 'POST' and isinstance(body, dict) for method, _, body in requests))
+
+
+class CatalogStatsTests(TestCase):
+    """Сводки магазинов и категорий пересчитываются импортом и отдаются без GROUP BY."""
+
+    def import_price_list(self, products):
+        import yaml
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'shop.yaml')
+            with open(path, 'w', encoding='utf-8') as file:
+                yaml.safe_dump(loadtest.make_price_list(1, products), file, allow_unicode=True)
+            self.assertTrue(load_data(path)['Status'])
+
+    def test_import_refreshes_stats(self):
+        self.import_price_list(10)
+        with self.assertNumQueries(1):
+            shops = self.client.get('/api/v1/shops/').json()
+        self.assertEqual(shops, [{'id': Shop.objects.get().id, 'name': 'Loadtest shop 1', 'state': True,
+                                  'products_count': 10, 'categories_count': 5,
+                                  'min_price': 1001, 'max_price': 1091}])
+        with self.assertNumQueries(1):
+            categories = self.client.get('/api/v1/categories/').json()
+        self.assertEqual(len(categories), 5)
+        self.assertEqual({category['products_count'] for category in categories}, {2})
+
+        # После повторного импорта с тремя товарами категории без товаров пропадают из списка
+        self.import_price_list(3)
+        self.assertEqual(self.client.get('/api/v1/shops/').json()[0]['products_count'], 3)
+        categories = self.client.get('/api/v1/categories/').json()
+        self.assertEqual(len(categories), 3)
+        self.assertEqual({category['shops_count'] for category in categories}, {1})
+
+    def test_closed_shops_are_not_counted_in_categories(self):
+        self.import_price_list(10)
+        shop = Shop.objects.get()
+        shop.state = False
+        shop.save()
+        self.assertEqual(self.client.get('/api/v1/categories/').json(), [])
+        shop.state = True
+        shop.save()
+        self.assertEqual(len(self.client.get('/api/v1/categories/').json()), 5)
+
+
+class ShopCategorySyncTests(TestCase):
+    """Связи магазина с категориями синхронизируются фиксированным числом запросов."""
+
+    def test_sync(self):
+        shop = Shop.objects.create(name='Связный')
+        other = Shop.objects.create(name='Другой')
+        Category.objects.create(id=1, name='Старая').shops.add(shop, other)
+        Category.objects.create(id=2, name='Смартфоны').shops.add(shop)
+        feed = [{'id': 2, 'name': 'Смартфоны'}, {'id': 3, 'name': 'Аксессуары'}, {'id': 4, 'name': 'Ноутбуки'},
+                {'id': None, 'name': 'Без ИД'}]
+
+        with self.assertNumQueries(4):
+            self.assertEqual(sync_shop_categories(shop, feed), [2, 3, 4])
+        self.assertEqual(set(shop.categories.values_list('id', flat=True)), {2, 3, 4})
+        self.assertEqual(Category.objects.get(id=3).name, 'Аксессуары')
+        # Связи других магазинов не затрагиваются
+        self.assertEqual(set(other.categories.values_list('id', flat=True)), {1})
+
+    def test_string_ids(self):
+        shop = Shop.objects.create(name='Связный')
+        Category.objects.create(id=1, name='Смартфоны').shops.add(shop)
+        self.assertEqual(sync_shop_categories(shop, [{'id': '1', 'name': 'Смартфоны'}, {'id': 'x', 'name': 'Ошибка'}]),
+                         [1])
+        self.assertEqual(set(shop.categories.values_list('id', flat=True)), {1})
+
+
+class PriceHistoryTests(TestCase):
+    """Импорт обновляет позиции на месте и пишет в историю только изменения."""
+
+    def import_price_list(self, price_list):
+        import yaml
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'shop.yaml')
+            with open(path, 'w', encoding='utf-8') as file:
+                yaml.safe_dump(price_list, file, allow_unicode=True)
+            self.assertTrue(load_data(path)['Status'])
+
+    def test_import_appends_changes(self):
+        price_list = loadtest.make_price_list(1, 3)
+        self.import_price_list(price_list)
+        self.assertEqual(PriceHistory.objects.count(), 3)
+        first, second, third = ProductInfo.objects.order_by('external_id')
+
+        price_list['goods'][0]['price'] = 555
+        price_list['goods'][1]['quantity'] = 7
+        del price_list['goods'][2]
+        self.import_price_list(price_list)
+
+        # Позиции сохранили ID, удалена только исчезнувшая из прайса
+        self.assertEqual(list(ProductInfo.objects.order_by('external_id').values_list('id', flat=True)),
+                         [first.id, second.id])
+        self.assertEqual(PriceHistory.objects.count(), 5)
+        # История удалённой позиции сохраняется
+        self.assertTrue(PriceHistory.objects.filter(product_info_id=third.id).exists())
+        self.assertEqual(list(PriceHistory.objects.filter(product_info=first).order_by('ts', 'id')
+                              .values_list('price', flat=True)), [first.price, 555])
+        self.assertEqual(list(PriceHistory.objects.filter(product_info=second).order_by('ts', 'id')
+                              .values_list('quantity', flat=True)), [second.quantity, 7])
+
+        # Повторный импорт без изменений историю не пополняет
+        self.import_price_list(price_list)
+        self.assertEqual(PriceHistory.objects.count(), 5)
+
+    def test_ordered_position_is_delisted_not_deleted(self):
+        price_list = loadtest.make_price_list(1, 2)
+        self.import_price_list(price_list)
+        ordered, in_basket = ProductInfo.objects.order_by('external_id')
+        user = User.objects.create_user('buyer@example.com', 'password', username='buyer')
+        order = Order.objects.create(user=user, state='confirmed')
+        OrderItem.objects.create(order=order, product_info=ordered, quantity=1, price=ordered.price)
+        basket = Order.objects.create(user=user, state='basket')
+        OrderItem.objects.create(order=basket, product_info=ordered, quantity=1)
+        OrderItem.objects.create(order=basket, product_info=in_basket, quantity=1)
+
+        price_list['goods'] = []
+        self.import_price_list(price_list)
+
+        self.assertEqual(list(ProductInfo.objects.values_list('id', 'quantity', 'delisted')), [(ordered.id, 0, True)])
+        self.assertEqual(list(OrderItem.objects.values_list('order_id', flat=True)), [order.id])
+
+        # Снятая с продажи позиция не попадает в каталог, выгрузку и сводки
+        self.assertEqual(self.client.get('/api/v1/products/').json(), [])
+        self.assertEqual(list(iter_product_rows()), [])
+        self.assertFalse(ShopStats.objects.filter(shop=ordered.shop).exists())
+
+        # Позиция, вернувшаяся в прайс, снова продаётся
+        self.import_price_list(loadtest.make_price_list(1, 1))
+        self.assertEqual(list(ProductInfo.objects.values_list('id', 'delisted')), [(ordered.id, False)])
+        self.assertEqual(ShopStats.objects.get(shop=ordered.shop).products_count, 1)
+
+    def test_celery_import_removes_stale_positions(self):
+        import yaml
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        price_list = loadtest.make_price_list(1, 3)
+        self.import_price_list(price_list)
+        del price_list['goods'][2]
+
+        with TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+            import_task = ImportTask.objects.create(yaml_file=SimpleUploadedFile(
+                'shop.yaml', yaml.safe_dump(price_list, allow_unicode=True).encode('utf-8')))
+            stats = do_import.apply(args=[import_task.id]).get()
+
+        # do_import обрабатывает прайс тем же кодом, что и load_data
+        self.assertEqual((stats['products'], stats['deleted'], stats['delisted']), (2, 1, 0))
+        self.assertEqual(ProductInfo.objects.count(), 2)
+        import_task.refresh_from_db()
+        self.assertTrue(import_task.is_processed)
+        self.assertEqual(import_task.products_count, 2)
+
+    def test_ordered_position_protects_shop(self):
+        from django.db.models import ProtectedError
+
+        self.import_price_list(loadtest.make_price_list(1, 1))
+        product_info = ProductInfo.objects.get()
+        user = User.objects.create_user('buyer@example.com', 'password', username='buyer')
+        order = Order.objects.create(user=user, state='confirmed')
+        OrderItem.objects.create(order=order, product_info=product_info, quantity=1, price=product_info.price)
+
+        for obj in (product_info.shop, product_info.product.category, product_info.product):
+            with self.assertRaises(ProtectedError), transaction.atomic():
+                obj.delete()
+
+        # Админка показывает защищённые объекты и ничего не удаляет
+        self.client.force_login(User.objects.create_superuser('admin@example.com', 'password', username='admin'))
+        url = f'/admin/backend/shop/{product_info.shop_id}/delete/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('protected', response.context)
+        self.assertTrue(response.context['protected'])
+        self.client.post(url, {'post': 'yes'})
+        self.assertTrue(Shop.objects.filter(id=product_info.shop_id).exists())
+        self.assertTrue(ProductInfo.objects.filter(id=product_info.id).exists())
+
+    def test_range_api(self):
+        self.import_price_list(loadtest.make_price_list(1, 2))
+        product_info = ProductInfo.objects.order_by('external_id').first()
+        PriceHistory.objects.filter(product_info=product_info).update(ts=timezone.now() - timedelta(days=10))
+        PriceHistory.objects.create(product_info=product_info, shop=product_info.shop, ts=timezone.now(),
+                                    price=1, price_rrc=1, quantity=1)
+        self.client.force_login(User.objects.create_user('analyst@example.com', 'password', username='analyst'))
+
+        response = self.client.get('/api/v1/products/price-history/', {'product_info_id': product_info.id})
+        self.assertEqual([point['price'] for point in response.json()['results']], [1, product_info.price])
+
+        date_from = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get('/api/v1/products/price-history/',
+                                   {'shop_id': product_info.shop_id, 'date_from': date_from})
+        self.assertEqual(len(response.json()['results']), 2)
+
+        self.assertEqual(self.client.get('/api/v1/products/price-history/').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/products/price-history/', {'shop_id': 'abc'}).status_code, 400)
@@ -0,0 +1,45 @@
+# backend/throttling.py
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+class LoginAttemptLimiter:
+    """
+    Ограничивает неудачные попытки входа по email и по IP в общем кэше.
+    Проверка выполняется до authenticate(), поэтому перебор паролей не тратит CPU на хэширование.
+    Лимиты: LOGIN_MAX_FAILURES_PER_EMAIL и LOGIN_MAX_FAILURES_PER_IP за LOGIN_FAILURE_WINDOW секунд.
+    """
+
+    def __init__(self, request, email):
+        # IP клиента: REMOTE_ADDR или X-Forwarded-For с учётом REST_FRAMEWORK['NUM_PROXIES']
+        ident = BaseThrottle().get_ident(request)
+        self.limits = {f'login-failures:ip:{ident}': settings.LOGIN_MAX_FAILURES_PER_IP}
+        if email:
+            email_hash = hashlib.sha256(str(email).strip().lower().encode()).hexdigest()
+            self.email_key = f'login-failures:email:{email_hash}'
+            self.limits[self.email_key] = settings.LOGIN_MAX_FAILURES_PER_EMAIL
+        else:
+            self.email_key = None
+
+    def is_blocked(self):
+        failures = cache.get_many(list(self.limits))
+        return any(failures.get(key, 0) >= limit for key, limit in self.limits.items())
+
+    def register_failure(self):
+        for key in self.limits:
+            # add() задаёт окно при первой ошибке, incr() его не продлевает
+            if not cache.add(key, 1, settings.LOGIN_FAILURE_WINDOW):
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    # Ключ истёк между add() и incr()
+                    cache.add(key, 1, settings.LOGIN_FAILURE_WINDOW)
+
+    def reset(self):
+        """Успешный вход сбрасывает счётчик по email (счётчик по IP истекает сам)."""
+        if self.email_key:
+            cache.delete(self.email_key)
@@ -5,11 +5,206 @@ from urllib.request import urlopen
 from urllib.parse import urlparse
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
-from .models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, User
+from django.db import transaction
+from .models import (
+    Shop, Category, Product, ProductInfo, Parameter, ProductParameter, User, OrderItem, StockReservation
+)
+from . import price_history
+from .catalog_stats import refresh_catalog_stats, shop_category_ids
+from .db_routers import use_primary
+from .cart import release_reservations
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def sync_shop_categories(shop, categories_data):
+    """
+    Создаёт недостающие категории прайса и синхронизирует связи магазина с категориями (Category.shops):
+    существующие связи читаются одним запросом, недостающие добавляются одним bulk insert
+    в промежуточную таблицу, а связи с категориями, которых больше нет в прайсе, удаляются.
+
+    :param categories_data: список словарей {'id': ..., 'name': ...} из YAML
+    :return: список ID категорий прайса
+    """
+    categories = {}
+    for category_data in categories_data:
+        category_name = category_data.get('name')
+        # ID в YAML может быть строкой ('1'); связи из БД читаются числами и должны с ним совпадать
+        try:
+            category_id = int(category_data.get('id'))
+        except (TypeError, ValueError):
+            category_id = None
+        if not category_id or not category_name:
+            logger.warning(f"Пропущена категория с некорректными данными: {category_data}")
+            continue
+        categories[category_id] = category_name
+
+    # Уже существующие категории пропускаются (ON CONFLICT DO NOTHING), их названия не меняются
+    Category.objects.bulk_create(
+        [Category(id=category_id, name=name) for category_id, name in categories.items()],
+        ignore_conflicts=True,
+    )
+
+    through = Category.shops.through
+    linked = set(through.objects.filter(shop_id=shop.id).values_list('category_id', flat=True))
+    through.objects.bulk_create(
+        [through(category_id=category_id, shop_id=shop.id) for category_id in categories if category_id not in linked],
+        ignore_conflicts=True,
+    )
+    stale = linked - set(categories)
+    if stale:
+        through.objects.filter(shop_id=shop.id, category_id__in=stale).delete()
+    logger.debug(f"Категории магазина {shop.name}: добавлено связей {len(set(categories) - linked)}, "
+                 f"удалено {len(stale)}")
+    return list(categories)
+
+
+@transaction.atomic
+def remove_stale_positions(product_info_ids):
+    """
+    Убирает позиции, которых нет в новом прайсе. Позиции убираются из корзин (резервы снимаются);
+    позиции, которые есть в оформленных заказах, не удаляются, а снимаются с продажи
+    (delisted=True, quantity=0), чтобы состав заказов сохранился. Остальные позиции удаляются.
+    Снятые с продажи позиции не попадают в каталог, выгрузку и сводки; повторный импорт возвращает их.
+
+    :return: (удалено, снято с продажи)
+    """
+    if not product_info_ids:
+        return 0, 0
+    release_reservations(StockReservation.objects.filter(product_info_id__in=product_info_ids))
+    OrderItem.objects.filter(product_info_id__in=product_info_ids, order__state='basket').delete()
+
+    ordered_ids = set(OrderItem.objects.filter(product_info_id__in=product_info_ids).values_list(
+        'product_info_id', flat=True))
+    delisted = ProductInfo.objects.filter(id__in=ordered_ids, delisted=False).update(quantity=0, delisted=True)
+    deleted = ProductInfo.objects.filter(id__in=set(product_info_ids) - ordered_ids).delete()[1].get(
+        ProductInfo._meta.label, 0)
+    return deleted, delisted
+
+
+def import_price_list(data, user_id=None):
+    """
+    Импортирует разобранный прайс-лист магазина (структура data/shop*.yaml).
+    Общий код load_data и Celery-задачи do_import, поэтому оба пути обрабатывают прайс одинаково:
+    позиции обновляются на месте, отсутствующие в прайсе удаляются или снимаются с продажи
+    (remove_stale_positions), изменения пишутся в историю цен, сводки каталога пересчитываются.
+    Транзакцией управляет вызывающий код.
+
+    :param data: словарь из YAML
+    :param user_id: (Опционально) ID владельца магазина
+    :return: статистика импорта: products, categories, parameters, deleted, delisted, price_changes
+    """
+    # Проверка структуры YAML
+    required_keys = ['shop', 'categories', 'goods']
+    for key in required_keys:
+        if key not in data:
+            raise ValueError(f'Некорректный формат YAML-файла. Отсутствует ключ: {key}.')
+
+    shop_name = data['shop']
+    categories_data = data['categories']
+    goods_data = data['goods']
+
+    # Получаем или создаем магазин
+    # Если user_id предоставлен (например, из API), связываем его с магазином
+    shop_defaults = {'state': True}
+    if user_id:
+        shop_defaults['user_id'] = user_id
+
+    shop, created = Shop.objects.get_or_create(
+        name=shop_name,
+        defaults=shop_defaults
+    )
+    if created:
+        logger.info(f"Создан магазин: {shop_name}")
+    else:
+        logger.info(f"Обновление прайса для магазина: {shop_name}")
+        if user_id and shop.user_id != user_id:
+             # Возможно, стоит добавить проверку прав на обновление чужого магазина
+             # или логировать попытку
+             pass # В рамках текущей задачи просто продолжаем
+
+    stats = {'products': 0, 'categories': 0, 'parameters': 0}
+
+    # Обработка категорий
+    stats['categories'] = len(sync_shop_categories(shop, categories_data))
+
+    # Категории, из которых магазин может уйти после импорта: их сводки тоже нужно пересчитать
+    old_category_ids = shop_category_ids(shop.id)
+
+    # Позиции обновляются на месте, поэтому история цен пишется как разница с этим снимком
+    before = price_history.snapshot(shop.id)
+    imported_ids = set()
+
+    # Обработка товаров
+    for item in goods_data:
+        product_name = item.get('name')
+        category_id = item.get('category')
+        external_id = item.get('id')
+        model_name = item.get('model', '')
+        price = item.get('price')
+        price_rrc = item.get('price_rrc')
+        quantity = item.get('quantity')
+        parameters = item.get('parameters', {})
+
+        # Проверяем обязательные поля
+        if not all([product_name, category_id, external_id, price, quantity]):
+             logger.error(f"Пропущен товар с некорректными данными: {item}")
+             continue
+
+        # Получаем или создаем Product
+        product, _ = Product.objects.get_or_create(
+            name=product_name,
+            defaults={'category_id': category_id} # Убедитесь, что категория с таким ID существует
+        )
+
+        # Создаем или обновляем ProductInfo
+        product_info, created = ProductInfo.objects.update_or_create(
+            external_id=external_id,
+            shop=shop,
+            defaults={
+                'product': product,
+                'model': model_name,
+                'price': price,
+                'price_rrc': price_rrc,
+                'quantity': quantity,
+                'delisted': False,
+            }
+        )
+        imported_ids.add(product_info.id)
+        stats['products'] += 1
+        action = "Создана" if created else "Обновлена"
+        logger.debug(f"{action} информация о товаре (ID: {external_id}): {product_name} ({shop.name})")
+
+        # Обработка параметров товара
+        for param_name, param_value in parameters.items():
+            if not param_name or not param_value:
+                 logger.warning(f"Пропущен параметр с некорректными данными для товара {product_name}: ({param_name}, {param_value})")
+                 continue
+
+            parameter_obj, _ = Parameter.objects.get_or_create(name=param_name)
+            ProductParameter.objects.update_or_create(
+                product_info=product_info,
+                parameter=parameter_obj,
+                defaults={'value': param_value}
+            )
+            stats['parameters'] += 1
+            logger.debug(f"  Параметр '{param_name}': {param_value} для товара {product_name}")
+
+    # Позиции магазина, которых нет в новом прайсе, удаляются или снимаются с продажи
+    stats['deleted'], stats['delisted'] = remove_stale_positions(set(before) - imported_ids)
+    logger.info(f"Удалено {stats['deleted']} старых записей ProductInfo для магазина {shop.name}, "
+                f"снято с продажи {stats['delisted']}.")
+
+    stats['price_changes'] = price_history.record_changes(shop.id, before)
+    logger.info(f"Изменились цены или остатки {stats['price_changes']} позиций магазина {shop.name}.")
+
+    refresh_catalog_stats([shop.id], old_category_ids | shop_category_ids(shop.id))
+
+    return stats
+
+
+@use_primary()
 def load_data(filepath_or_url, user_id=None):
     """
     Загружает данные из YAML-файла (по пути или URL) в базу данных.
@@ -38,113 +233,17 @@ def load_data(filepath_or_url, user_id=None):
             with open(filepath_or_url, 'r', encoding='utf-8') as file:
                 data = yaml.safe_load(file)
 
-        # Проверка структуры YAML
-        required_keys = ['shop', 'categories', 'goods']
-        for key in required_keys:
-            if key not in data:
-                return {'Status': False, 'Error': f'Некорректный формат YAML-файла. Отсутствует ключ: {key}.'}
-
-        shop_name = data['shop']
-        categories_data = data['categories']
-        goods_data = data['goods']
-
-        # Получаем или создаем магазин
-        # Если user_id предоставлен (например, из API), связываем его с магазином
-        shop_defaults = {'state': True}
-        if user_id:
-            shop_defaults['user_id'] = user_id
-
-        shop, created = Shop.objects.get_or_create(
-            name=shop_name,
-            defaults=shop_defaults
-        )
-        if created:
-            logger.info(f"Создан магазин: {shop_name}")
-        else:
-            logger.info(f"Обновление прайса для магазина: {shop_name}")
-            if user_id and shop.user_id != user_id:
-                 # Возможно, стоит добавить проверку прав на обновление чужого магазина
-                 # или логировать попытку
-                 pass # В рамках текущей задачи просто продолжаем
-
-        # Обработка категорий
-        for category_data in categories_data:
-            category_id = category_data.get('id')
-            category_name = category_data.get('name')
-
-            if not category_id or not category_name:
-                logger.warning(f"Пропущена категория с некорректными данными: {category_data}")
-                continue
-
-            category_obj, _ = Category.objects.get_or_create(
-                id=category_id,
-                defaults={'name': category_name}
-            )
-            # Связываем магазин с категорией
-            if shop not in category_obj.shops.all():
-                category_obj.shops.add(shop)
-                logger.debug(f"Магазин {shop.name} добавлен к категории {category_obj.name}")
-
-        # Удаляем старые ProductInfo для этого магазина перед импортом новых
-        deleted_count, _ = ProductInfo.objects.filter(shop_id=shop.id).delete()
-        logger.info(f"Удалено {deleted_count} старых записей ProductInfo для магазина {shop.name}.")
-
-        # Обработка товаров
-        for item in goods_data:
-            product_name = item.get('name')
-            category_id = item.get('category')
-            external_id = item.get('id')
-            model_name = item.get('model', '')
-            price = item.get('price')
-            price_rrc = item.get('price_rrc')
-            quantity = item.get('quantity')
-            parameters = item.get('parameters', {})
-
-            # Проверяем обязательные поля
-            if not all([product_name, category_id, external_id, price, quantity]):
-                 logger.error(f"Пропущен товар с некорректными данными: {item}")
-                 continue
-
-            # Получаем или создаем Product
-            product, _ = Product.objects.get_or_create(
-                name=product_name,
-                defaults={'category_id': category_id} # Убедитесь, что категория с таким ID существует
-            )
-
-            # Создаем или обновляем ProductInfo
-            product_info, created = ProductInfo.objects.update_or_create(
-                external_id=external_id,
-                shop=shop,
-                defaults={
-                    'product': product,
-                    'model': model_name,
-                    'price': price,
-                    'price_rrc': price_rrc,
-                    'quantity': quantity,
-                }
-            )
-            action = "Создана" if created else "Обновлена"
-            logger.debug(f"{action} информация о товаре (ID: {external_id}): {product_name} ({shop.name})")
-
-            # Обработка параметров товара
-            for param_name, param_value in parameters.items():
-                if not param_name or not param_value:
-                     logger.warning(f"Пропущен параметр с некорректными данными для товара {product_name}: ({param_name}, {param_value})")
-                     continue
-
-                parameter_obj, _ = Parameter.objects.get_or_create(name=param_name)
-                ProductParameter.objects.update_or_create(
-                    product_info=product_info,
-                    parameter=parameter_obj,
-                    defaults={'value': param_value}
-                )
-                logger.debug(f"  Параметр '{param_name}': {param_value} для товара {product_name}")
+        with transaction.atomic():
+            import_price_list(data, user_id)
 
         return {'Status': True, 'Message': f'Импорт из {filepath_or_url} завершен успешно.'}
 
     except FileNotFoundError:
         logger.error(f"Файл {filepath_or_url} не найден.")
         return {'Status': False, 'Error': f'Файл {filepath_or_url} не найден.'}
+    except ValueError as e:
+        logger.error(f"Ошибка в данных {filepath_or_url}: {str(e)}")
+        return {'Status': False, 'Error': str(e)}
     except yaml.YAMLError as e:
         logger.error(f"Ошибка парсинга YAML из {filepath_or_url}: {str(e)}")
         return {'Status': False, 'Error': f'Ошибка парсинга YAML: {str(e)}'}
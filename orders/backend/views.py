@@ -1,22 +1,63 @@
 # backend/views.py
 
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import login
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from functools import wraps
+from rest_framework.exceptions import ValidationError
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated
-from .models import Shop, Category, Product, ProductInfo, Order, OrderItem, Contact
+from .models import (
+    Shop, Category, Product, ProductInfo, Order, OrderItem, Contact, ConfirmEmailToken, ShopStats, CategoryStats,
+    PriceHistory
+)
 from .serializers import (
     UserLoginSerializer, UserRegistrationSerializer, ProductInfoSerializer,
     CartItemSerializer, AddContactSerializer, OrderConfirmationSerializer,
-    OrderHistorySerializer
+    OrderHistorySerializer, CartBatchSerializer, PartnerOrderSerializer, ConfirmEmailSerializer,
+    ShopStatsSerializer, CategoryStatsSerializer, PriceHistorySerializer
 )
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
+from django.utils.dateparse import parse_datetime, parse_date
+from .permissions import IsShopUser
+from .pagination import PartnerOrderCursorPagination, PriceHistoryCursorPagination
 from rest_framework.response import Response
 from .tasks import do_import
 from .models import ImportTask
+from .export import iter_product_rows, iter_ndjson, iter_csv
+from .checkout import CheckoutError, place_order
+from .outbox import publish_event
+from .throttling import LoginAttemptLimiter
+from .cart import (
+    InsufficientStockError, StaleBasketError, forget_basket, get_basket_id, parse_quantity,
+    add_to_cart, add_many_to_cart, set_item_quantity, remove_cart_items
+)
+
+
+def _retry_stale_basket(method):
+    """
+    Запись в корзину по устаревшему закэшированному ID (заказ уже оформлен) отклоняется с StaleBasketError.
+    Тогда кэш сбрасывается и запрос повторяется один раз с ID, прочитанным из БД.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        try:
+            return method(self, request, *args, **kwargs)
+        except StaleBasketError:
+            forget_basket(request.user.pk)
+        try:
+            return method(self, request, *args, **kwargs)
+        except StaleBasketError:
+            return Response({'error': 'Корзина изменилась, повторите запрос'}, status=status.HTTP_409_CONFLICT)
+    return wrapper
 
 
 class LoginView(APIView):
@@ -25,18 +66,27 @@ class LoginView(APIView):
     """
 
     def post(self, request):
+        # Перебор паролей отсекается до authenticate(), чтобы не тратить CPU на хэширование
+        # Тело может оказаться списком или строкой JSON — тогда его отклонит сериализатор
+        email = request.data.get('email') if isinstance(request.data, dict) else None
+        limiter = LoginAttemptLimiter(request, email)
+        if limiter.is_blocked():
+            return Response({'error': 'Слишком много неудачных попыток входа. Попробуйте позже.'},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS,
+                            headers={'Retry-After': str(settings.LOGIN_FAILURE_WINDOW)})
+
         serializer = UserLoginSerializer(data=request.data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            limiter.register_failure()
+            raise ValidationError(serializer.errors)
+        limiter.reset()
         user = serializer.validated_data["user"]
 
         login(request, user)  # Устанавливаем сессию (работает с SessionAuthentication)
 
-        # Если используешь TokenAuthentication:
-        # token, created = Token.objects.get_or_create(user=user)
-        # return Response({'token': token.key})
-
-        # Если просто сессия, возвращаем успех
-        return Response({'message': 'Успешный вход'}, status=status.HTTP_200_OK)
+        # Токен для API-клиентов: заголовок Authorization: Token <key> (CachedTokenAuthentication)
+        token, created = Token.objects.get_or_create(user=user)
+        return Response({'message': 'Успешный вход', 'token': token.key}, status=status.HTTP_200_OK)
 
 
 class RegisterView(APIView):
@@ -47,25 +97,41 @@ class RegisterView(APIView):
     def post(self, request):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            # --- НОВЫЙ КОД ---
-            # Запускаем задачу на отправку email подтверждения через Celery
-            from .tasks import send_registration_confirmation_email
-            task = send_registration_confirmation_email.delay(user.email, user.id)
-            if task:
-                message = 'Пользователь успешно зарегистрирован. Проверьте ваш email для подтверждения.'
-            else:
-                message = 'Пользователь успешно зарегистрирован, но письмо подтверждения не было отправлено.'
-            # ----------------
+            # Письмо подтверждения отправит Celery после фиксации транзакции (через outbox)
+            with transaction.atomic():
+                user = serializer.save()
+                publish_event('backend.tasks.send_registration_confirmation_email', user.email, user.id)
+            message = 'Пользователь успешно зарегистрирован. Проверьте ваш email для подтверждения.'
             return Response({'message': message}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ConfirmEmailView(APIView):
+    """
+    Подтверждение email по токену из письма.
+    """
+
+    def post(self, request):
+        serializer = ConfirmEmailSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'error': 'Неверный или просроченный токен.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = serializer.validated_data['user']
+        with transaction.atomic():
+            if not user.is_active:
+                user.is_active = True
+                user.save(update_fields=['is_active'])
+            # Токены пользователя больше не нужны
+            ConfirmEmailToken.objects.filter(user=user).delete()
+        return Response({'message': 'Email подтверждён.'}, status=status.HTTP_200_OK)
+
+
 class ProductListView(generics.ListAPIView):
     """
     Список товаров.
     """
-    queryset = ProductInfo.objects.select_related('product', 'shop').prefetch_related('product_parameters__parameter')
+    queryset = ProductInfo.objects.filter(delisted=False).select_related('product', 'shop').prefetch_related(
+        'product_parameters__parameter')
     serializer_class = ProductInfoSerializer
 
     def get_queryset(self):
@@ -86,6 +152,53 @@ class ProductListView(generics.ListAPIView):
         return queryset
 
 
+class ShopListView(generics.ListAPIView):
+    """
+    Список магазинов с количеством товаров и диапазоном цен.
+    Сводки читаются из ShopStats, которую пересчитывает импорт прайса.
+    """
+    queryset = ShopStats.objects.select_related('shop').order_by('shop__name')
+    serializer_class = ShopStatsSerializer
+
+
+class CategoryListView(generics.ListAPIView):
+    """
+    Список категорий с количеством товаров и магазинов и диапазоном цен.
+    Сводки читаются из CategoryStats, которую пересчитывает импорт прайса.
+    """
+    queryset = CategoryStats.objects.select_related('category').order_by('category__name')
+    serializer_class = CategoryStatsSerializer
+
+
+class ProductExportView(APIView):
+    """
+    Потоковая выгрузка всего каталога товаров в NDJSON или CSV.
+    """
+    formats = {
+        'ndjson': ('application/x-ndjson', iter_ndjson),
+        'csv': ('text/csv; charset=utf-8', iter_csv),
+    }
+
+    def get(self, request):
+        # Параметр называется output, т.к. format зарезервирован DRF под content negotiation
+        output = request.query_params.get('output', 'ndjson')
+        if output not in self.formats:
+            return Response({'error': 'output должен быть ndjson или csv'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = ProductInfo.objects.filter(delisted=False)
+        shop_id = request.query_params.get('shop_id')
+        category_id = request.query_params.get('category_id')
+        if shop_id:
+            queryset = queryset.filter(shop_id=_parse_id('shop_id', shop_id))
+        if category_id:
+            queryset = queryset.filter(product__category_id=_parse_id('category_id', category_id))
+
+        content_type, stream = self.formats[output]
+        response = StreamingHttpResponse(stream(iter_product_rows(queryset)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="products.{output}"'
+        return response
+
+
 class CartView(APIView):
     """
     Управление корзиной.
@@ -97,90 +210,99 @@ class CartView(APIView):
         Получить содержимое корзины и её ID.
         """
         # Получаем или создаём корзину (Order со статусом 'basket') для текущего пользователя
-        cart, created = Order.objects.get_or_create(user=request.user, state='basket')
+        cart_id = get_basket_id(request.user)
 
         # Получаем элементы корзины (OrderItem)
-        items = cart.ordered_items.all()
+        items = OrderItem.objects.filter(order_id=cart_id).select_related(
+            'product_info__product', 'product_info__shop'
+        ).prefetch_related('product_info__product_parameters__parameter')
 
         # Сериализуем элементы
         serializer = CartItemSerializer(items, many=True)
 
         # Возвращаем ID корзины и содержимое
         return Response({
-            'basket_id': cart.id,  # <-- Добавляем ID корзины
+            'basket_id': cart_id,  # <-- Добавляем ID корзины
             'items': serializer.data
         })
 
+    @_retry_stale_basket
     def post(self, request):
         """
         Добавить товар в корзину.
         """
-        cart, created = Order.objects.get_or_create(user=request.user, state='basket')
+        cart_id = get_basket_id(request.user)
         product_info_id = request.data.get('product_info_id')
         quantity = request.data.get('quantity', 1)
 
         if not product_info_id or not quantity:
             return Response({'error': 'product_info_id и quantity обязательны'}, status=status.HTTP_400_BAD_REQUEST)
 
-        product_info = get_object_or_404(ProductInfo, id=product_info_id)
-
-        # Проверяем доступное количество
-        if quantity > product_info.quantity:
+        try:
+            quantity = parse_quantity(quantity)
+        except (TypeError, ValueError):
+            return Response({'error': 'quantity должно быть положительным целым числом'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        product_info_id = _parse_id('product_info_id', product_info_id)
+        try:
+            # Атомарно увеличиваем количество с проверкой остатка на складе
+            add_to_cart(cart_id, product_info_id, quantity)
+        except ProductInfo.DoesNotExist:
+            raise Http404
+        except InsufficientStockError:
             return Response({'error': 'Недостаточно товара на складе'}, status=status.HTTP_400_BAD_REQUEST)
 
-        order_item, created = OrderItem.objects.get_or_create(
-            order=cart,
-            product_info=product_info,
-            defaults={'quantity': quantity}
-        )
-        if not created:
-            # Обновляем количество, если товар уже в корзине
-            order_item.quantity += int(quantity)
-            # Проверяем снова после увеличения
-            if order_item.quantity > product_info.quantity:
-                return Response({'error': 'Недостаточно товара на складе'}, status=status.HTTP_400_BAD_REQUEST)
-            order_item.save()
-
         return Response({'message': 'Товар добавлен в корзину'}, status=status.HTTP_201_CREATED)
 
+    @_retry_stale_basket
     def put(self, request):
         """
         Обновить количество товара в корзине.
         """
-        cart = get_object_or_404(Order, user=request.user, state='basket')
+        cart_id = get_basket_id(request.user, create=False)
+        if cart_id is None:
+            raise Http404
         order_item_id = request.data.get('order_item_id')
         quantity = request.data.get('quantity')
 
         if not order_item_id or quantity is None:
             return Response({'error': 'order_item_id и quantity обязательны'}, status=status.HTTP_400_BAD_REQUEST)
 
-        order_item = get_object_or_404(OrderItem, id=order_item_id, order=cart)
-        product_info = order_item.product_info
+        try:
+            quantity = parse_quantity(quantity, allow_zero=True)
+        except (TypeError, ValueError):
+            return Response({'error': 'quantity должно быть неотрицательным целым числом'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        # Проверяем доступное количество
-        if int(quantity) > product_info.quantity:
-            return Response({'error': 'Недостаточно товара на складе'}, status=status.HTTP_400_BAD_REQUEST)
+        order_item = get_object_or_404(OrderItem, id=_parse_id('order_item_id', order_item_id), order_id=cart_id)
 
-        if int(quantity) <= 0:
-            order_item.delete()
+        if quantity == 0:
+            remove_cart_items(cart_id, OrderItem.objects.filter(id=order_item.id))
             return Response({'message': 'Товар удален из корзины'}, status=status.HTTP_200_OK)
 
-        order_item.quantity = int(quantity)
-        order_item.save()
+        try:
+            set_item_quantity(order_item, quantity)
+        except InsufficientStockError:
+            return Response({'error': 'Недостаточно товара на складе'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'message': 'Количество товара обновлено'}, status=status.HTTP_200_OK)
 
+    @_retry_stale_basket
     def delete(self, request):
         """
         Удалить товар из корзины.
         """
-        cart = get_object_or_404(Order, user=request.user, state='basket')
+        cart_id = get_basket_id(request.user, create=False)
+        if cart_id is None:
+            raise Http404
         order_item_id = request.query_params.get('order_item_id')
 
         if not order_item_id:
             return Response({'error': 'order_item_id обязателен'}, status=status.HTTP_400_BAD_REQUEST)
 
-        order_item = get_object_or_404(OrderItem, id=order_item_id, order=cart)
-        order_item.delete()
+        order_item_id = _parse_id('order_item_id', order_item_id)
+        if not remove_cart_items(cart_id, OrderItem.objects.filter(id=order_item_id, order_id=cart_id)):
+            raise Http404
         return Response({'message': 'Товар удален из корзины'}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -217,16 +339,17 @@ class OrderConfirmationView(APIView):
             basket = serializer.validated_data['basket_id']
             contact = serializer.validated_data['contact_id']
 
-            # Обновляем статус корзины
-            basket.state = 'confirmed'  # или 'new', как у тебя принято
-            basket.contact = contact
-            basket.save()
-
-            # --- НОВЫЙ КОД ---
-            # Запускаем задачу на отправку email через Celery
-            from .tasks import send_order_confirmation_email
-            task = send_order_confirmation_email.delay(basket.id, contact.id)
-            # ----------------
+            # Списываем остатки, фиксируем цены и переводим корзину в статус 'confirmed'.
+            # Письмо ставится в outbox в той же транзакции
+            try:
+                with transaction.atomic():
+                    place_order(basket, contact)
+                    publish_event('backend.tasks.send_order_confirmation_email', basket.id, contact.id)
+            except CheckoutError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except InsufficientStockError as e:
+                return Response({'error': 'Недостаточно товара на складе', 'product_info_ids': e.product_info_ids},
+                                status=status.HTTP_400_BAD_REQUEST)
 
             return Response({'message': 'Заказ подтвержден. Информация продублирована на Вашу почту.'},
                             status=status.HTTP_200_OK)
@@ -242,7 +365,119 @@ class OrderHistoryView(generics.ListAPIView):
 
     def get_queryset(self):
         # Возвращаем все заказы пользователя, кроме корзины
-        return Order.objects.filter(user=self.request.user).exclude(state='basket').order_by('-dt')
+        # Подзаказы магазинов показываются внутри родительского заказа
+        return Order.objects.filter(
+            user=self.request.user, parent__isnull=True
+        ).exclude(state='basket').order_by('-dt').prefetch_related(
+            'ordered_items__product_info__product', 'ordered_items__product_info__shop',
+            'ordered_items__product_info__product_parameters__parameter',
+            'sub_orders__ordered_items__product_info__product', 'sub_orders__ordered_items__product_info__shop',
+            'sub_orders__ordered_items__product_info__product_parameters__parameter',
+        )
+
+
+def _parse_id(name, value):
+    """Целочисленный ID из параметра запроса; иначе 400 вместо ошибки сервера в фильтре"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({'error': f'Некорректный {name}: {value}'})
+
+
+def _parse_dt(value):
+    """
+    Дата или дата-время в ISO-формате из параметра запроса.
+    :return: (момент времени, задана ли только дата)
+    """
+    try:
+        # Сначала дата: parse_datetime принимает и '2024-03-01', превращая её в полночь
+        date = parse_date(value)
+        dt = parse_datetime(value) if date is None else None
+    except ValueError:
+        # Формат верный, но такой даты нет (2024-02-30)
+        dt = date = None
+    if date is not None:
+        return timezone.make_aware(datetime.combine(date, time.min)), True
+    if dt is None:
+        raise ValidationError({'error': f'Некорректная дата: {value}'})
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt, False
+
+
+def _filter_period(queryset, field, date_from, date_to):
+    """
+    Фильтр field по date_from/date_to (включительно).
+    Если date_to — дата без времени, в выборку попадает весь этот день (field < начала следующего дня).
+    """
+    if date_from:
+        queryset = queryset.filter(**{f'{field}__gte': _parse_dt(date_from)[0]})
+    if date_to:
+        dt, date_only = _parse_dt(date_to)
+        if date_only:
+            queryset = queryset.filter(**{f'{field}__lt': dt + timedelta(days=1)})
+        else:
+            queryset = queryset.filter(**{f'{field}__lte': dt})
+    return queryset
+
+
+class PartnerOrderFeedView(generics.ListAPIView):
+    """
+    Лента заказов магазина.
+    Фильтры: state (через запятую), date_from, date_to (дата или дата-время в ISO-формате).
+    """
+    serializer_class = PartnerOrderSerializer
+    permission_classes = [IsAuthenticated, IsShopUser]
+    pagination_class = PartnerOrderCursorPagination
+
+    def get_queryset(self):
+        shop_id = Shop.objects.filter(user=self.request.user).values_list('id', flat=True).first()
+        if shop_id is None:
+            return Order.objects.none()
+
+        # Подзаказы несут shop_id, поэтому лента — выборка из одной таблицы
+        # по индексу (shop, -id) без join-ов и DISTINCT
+        queryset = Order.objects.filter(shop_id=shop_id).select_related('contact').prefetch_related(
+            'ordered_items__product_info__product', 'ordered_items__product_info__shop',
+            'ordered_items__product_info__product_parameters__parameter',
+        )
+
+        state = self.request.query_params.get('state')
+        date_from = self.request.query_params.get('date_from')
+        date_to = self.request.query_params.get('date_to')
+
+        if state:
+            queryset = queryset.filter(state__in=state.split(','))
+        queryset = _filter_period(queryset, 'dt', date_from, date_to)
+
+        return queryset
+
+
+class PriceHistoryView(generics.ListAPIView):
+    """
+    История цен и остатков позиции (product_info_id) или всех позиций магазина (shop_id).
+    Фильтры: date_from, date_to (дата или дата-время в ISO-формате). Новые записи — первыми.
+    """
+    serializer_class = PriceHistorySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = PriceHistoryCursorPagination
+
+    def get_queryset(self):
+        product_info_id = self.request.query_params.get('product_info_id')
+        shop_id = self.request.query_params.get('shop_id')
+        date_from = self.request.query_params.get('date_from')
+        date_to = self.request.query_params.get('date_to')
+
+        # Фильтр по позиции или магазину и диапазон ts читаются по индексу (product_info, ts) или (shop, ts)
+        if product_info_id:
+            queryset = PriceHistory.objects.filter(product_info_id=_parse_id('product_info_id', product_info_id))
+        elif shop_id:
+            queryset = PriceHistory.objects.filter(shop_id=_parse_id('shop_id', shop_id))
+        else:
+            raise ValidationError({'error': 'Укажите product_info_id или shop_id'})
+        queryset = _filter_period(queryset, 'ts', date_from, date_to)
+
+        return queryset
 
 
 class ContactListView(generics.ListAPIView):
@@ -296,18 +531,22 @@ class DeleteCartItemView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
+    @_retry_stale_basket
     def delete(self, request):
         """
         Удалить товар из корзины.
         """
-        cart = get_object_or_404(Order, user=request.user, state='basket')
+        cart_id = get_basket_id(request.user, create=False)
+        if cart_id is None:
+            raise Http404
         order_item_id = request.query_params.get('order_item_id')
 
         if not order_item_id:
             return Response({'error': 'order_item_id обязателен'}, status=status.HTTP_400_BAD_REQUEST)
 
-        order_item = get_object_or_404(OrderItem, id=order_item_id, order=cart)
-        order_item.delete()
+        order_item_id = _parse_id('order_item_id', order_item_id)
+        if not remove_cart_items(cart_id, OrderItem.objects.filter(id=order_item_id, order_id=cart_id)):
+            raise Http404
         return Response({'message': 'Товар удален из корзины'}, status=status.HTTP_200_OK)
 
 
@@ -366,12 +605,52 @@ class ContactDetailView(generics.RetrieveAPIView):
 
 # --- УЛУЧШЕННЫЙ КОД ДЛЯ УДАЛЕНИЯ ТОВАРОВ ---
 
+class BatchCartItemView(APIView):
+    """
+    Добавить несколько товаров в корзину одним запросом.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @_retry_stale_basket
+    def post(self, request):
+        """
+        Добавить несколько товаров в корзину.
+
+        Пример запроса:
+        {
+            "items": [
+                {"product_info_id": 3, "quantity": 2},
+                {"product_info_id": 5, "quantity": 1}
+            ]
+        }
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lines = serializer.get_lines()
+
+        cart_id = get_basket_id(request.user)
+        try:
+            add_many_to_cart(cart_id, lines)
+        except ProductInfo.DoesNotExist as e:
+            return Response({'error': 'Товары не найдены', 'product_info_ids': e.args[0]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStockError as e:
+            return Response({'error': 'Недостаточно товара на складе', 'product_info_ids': e.product_info_ids},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'message': f'Добавлено {len(lines)} товаров в корзину',
+            'items_count': len(lines)
+        }, status=status.HTTP_201_CREATED)
+
+
 class BatchDeleteCartItemView(APIView):
     """
     Удалить несколько товаров из корзины одновременно.
     """
     permission_classes = [IsAuthenticated]
 
+    @_retry_stale_basket
     def post(self, request):
         """
         Удалить несколько товаров из корзины.
@@ -381,17 +660,19 @@ class BatchDeleteCartItemView(APIView):
             "order_item_ids": [3, 5, 7]
         }
         """
-        cart = get_object_or_404(Order, user=request.user, state='basket')
+        cart_id = get_basket_id(request.user, create=False)
+        if cart_id is None:
+            raise Http404
         order_item_ids = request.data.get('order_item_ids')
 
         if not order_item_ids or not isinstance(order_item_ids, list):
             return Response({'error': 'order_item_ids должен быть списком ID'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Удаляем все указанные товары
-        deleted_count = OrderItem.objects.filter(
-            order=cart,
+        deleted_count = remove_cart_items(cart_id, OrderItem.objects.filter(
+            order_id=cart_id,
             id__in=order_item_ids
-        ).delete()[0]
+        ))
 
         return Response({
             'message': f'Удалено {deleted_count} товаров из корзины',
@@ -405,14 +686,17 @@ class ClearCartView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
+    @_retry_stale_basket
     def delete(self, request):
         """
         Удалить все товары из корзины.
         """
-        cart = get_object_or_404(Order, user=request.user, state='basket')
+        cart_id = get_basket_id(request.user, create=False)
+        if cart_id is None:
+            raise Http404
 
         # Удаляем все товары из корзины
-        deleted_count = cart.ordered_items.all().delete()[0]
+        deleted_count = remove_cart_items(cart_id, OrderItem.objects.filter(order_id=cart_id))
 
         return Response({
             'message': f'Корзина очищена. Удалено {deleted_count} товаров',
@@ -1,3 +1,4 @@
+import copy
 import os
 from pathlib import Path
 
@@ -27,11 +28,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'backend',
-    'rest_framework'
+    'rest_framework',
+    'rest_framework.authtoken',
 ]
 
 MIDDLEWARE = [
+    'backend.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'backend.middleware.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'backend.middleware.DisableCSRFForAPIMiddleware',
@@ -41,6 +45,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Метрики запросов (backend/middleware.py: PerformanceMiddleware, backend/metrics.py)
+if os.environ.get('PERFORMANCE_MIDDLEWARE', '1') != '1':
+    MIDDLEWARE.remove('backend.middleware.PerformanceMiddleware')
+# С каких адресов доступен /metrics/
+PERFORMANCE_METRICS_ALLOWED_IPS = os.environ.get('PERFORMANCE_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+# Запросы дольше этого времени, сек., пишутся в лог backend.performance вместе с самыми долгими SQL
+PERFORMANCE_SLOW_REQUEST_SECONDS = float(os.environ.get('PERFORMANCE_SLOW_REQUEST_SECONDS', 1.0))
+# Доля запросов, профилируемых cProfile (0 — профилирование выключено), и каталог для .prof-файлов
+PERFORMANCE_PROFILE_SAMPLE_RATE = float(os.environ.get('PERFORMANCE_PROFILE_SAMPLE_RATE', 0))
+PERFORMANCE_PROFILE_DIR = os.environ.get('PERFORMANCE_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
 ROOT_URLCONF = 'orders.urls'
 
 TEMPLATES = [
@@ -64,13 +79,126 @@ WSGI_APPLICATION = 'orders.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgres — рабочая конфигурация, по умолчанию SQLite для локального запуска и тестов.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'orders'),
+            'USER': os.environ.get('POSTGRES_USER', 'orders'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'postgres'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    # Размер пула соединений psycopg на процесс. 0 — без пула, с постоянными соединениями.
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+    if DB_POOL_MAX_SIZE:
+        # Пул несовместим с CONN_MAX_AGE: соединение возвращается в пул в конце запроса/задачи
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+                'max_size': DB_POOL_MAX_SIZE,
+                'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            },
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # busy timeout, сек.: ждём снятия блокировки вместо "database is locked"
+                'timeout': 20,
+                # Пишущие транзакции сразу берут блокировку записи, без гонки при её повышении
+                'transaction_mode': 'IMMEDIATE',
+                # WAL позволяет читать параллельно с импортом
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+
+# Реплики для чтения. Для PostgreSQL — POSTGRES_REPLICA_HOSTS=host1,host2,
+# для SQLite (локальная проверка) — SQLITE_REPLICA_PATHS=/path/replica1.sqlite3,...
+# Без реплик роутер отправляет всё в default.
+_replica_values = os.environ.get('POSTGRES_REPLICA_HOSTS' if DB_ENGINE == 'postgres' else 'SQLITE_REPLICA_PATHS', '')
+DATABASE_REPLICAS = []
+for _number, _value in enumerate(filter(None, _replica_values.split(',')), start=1):
+    _alias = f'replica{_number}'
+    DATABASES[_alias] = copy.deepcopy(DATABASES['default'])
+    DATABASES[_alias]['HOST' if DB_ENGINE == 'postgres' else 'NAME'] = _value.strip()
+    # В тестах реплика смотрит в тестовую default
+    DATABASES[_alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['backend.db_routers.ReplicaRouter']
+# Сколько секунд после изменяющего запроса клиент читает из основной БД
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+
+# Cache
+# CACHE_URL задаёт Redis (в docker-compose — redis://redis:6379/1); без него используется
+# локальный кэш в памяти процесса, и runserver/manage.py работают без Redis.
+# Тесты всегда идут на локальном кэше (backend/test_runner.py).
+CACHE_URL = os.environ.get('CACHE_URL', '')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
+
+TEST_RUNNER = 'backend.test_runner.LocalCacheTestRunner'
+
+
+# Sessions
+# Хранилище сессий: db | cached_db | cache | signed_cookies.
+# cached_db читает сессию из кэша (Redis) и обращается к БД только при записи и промахе кэша,
+# signed_cookies хранит сессию в подписанной cookie и не обращается ни к БД, ни к кэшу.
+SESSION_STORAGE = os.environ.get('SESSION_STORAGE', 'cached_db')
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
 }
+SESSION_ENGINE = SESSION_ENGINES[SESSION_STORAGE]
+
+
+# Password hashing
+# Хэшер для новых паролей: argon2 | pbkdf2. Хэши остальных алгоритмов проверяются
+# и пересчитываются выбранным хэшером при следующем успешном входе.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'argon2')
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 64 * 1024))  # КиБ
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 2))
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', 1_000_000))
+PASSWORD_HASHERS = {
+    'argon2': ['backend.hashers.TunedArgon2PasswordHasher', 'backend.hashers.TunedPBKDF2PasswordHasher'],
+    'pbkdf2': ['backend.hashers.TunedPBKDF2PasswordHasher', 'backend.hashers.TunedArgon2PasswordHasher'],
+}[PASSWORD_HASHER] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
 
+# Ограничение неудачных попыток входа (backend/throttling.py)
+LOGIN_MAX_FAILURES_PER_EMAIL = int(os.environ.get('LOGIN_MAX_FAILURES_PER_EMAIL', 5))
+LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', 50))
+LOGIN_FAILURE_WINDOW = 15 * 60
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -113,7 +241,37 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'backend.User'
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+# Для проверки с локальным SMTP-сервером: EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend,
+# EMAIL_HOST=localhost, EMAIL_PORT=1025
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '') == '1'
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 10))
+
+# Django REST framework
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'backend.authentication.CachedTokenAuthentication',
+        # Классы по умолчанию DRF — клиенты с сессией и Basic-аутентификацией продолжают работать
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.UJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.parsers.UJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Сколько доверенных прокси стоит перед приложением. 0 — IP клиента берётся из REMOTE_ADDR,
+    # X-Forwarded-For игнорируется (его может подделать клиент)
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
 
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://redis:6379/0')
@@ -123,5 +281,81 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Очереди: импорт (долгие задачи), почта (лёгкие) и всё остальное.
+# Каждая очередь обслуживается своим воркером (см. docker-compose.yml) и масштабируется отдельно.
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'backend.tasks.do_import': {'queue': 'imports'},
+    'backend.tasks.send_registration_confirmation_email': {'queue': 'mail'},
+    'backend.tasks.send_order_confirmation_email': {'queue': 'mail'},
+    'backend.tasks.flush_outgoing_emails': {'queue': 'mail'},
+}
+# Задачи подтверждаются после выполнения: при падении воркера сообщение вернётся в очередь,
+# а ключи идемпотентности (backend/task_base.py) не дадут выполнить его дважды
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get('CELERY_PREFETCH_MULTIPLIER', 4))
+# Процесс воркера перезапускается после N задач, чтобы не копить память после разбора больших YAML
+CELERY_WORKER_MAX_TASKS_PER_CHILD = int(os.environ.get('CELERY_MAX_TASKS_PER_CHILD', 100))
+CELERY_TASK_SOFT_TIME_LIMIT = 4 * 60
+CELERY_TASK_TIME_LIMIT = 5 * 60
+# Лимиты времени импорта, сек.
+IMPORT_TASK_SOFT_TIME_LIMIT = int(os.environ.get('IMPORT_TASK_SOFT_TIME_LIMIT', 30 * 60))
+IMPORT_TASK_TIME_LIMIT = IMPORT_TASK_SOFT_TIME_LIMIT + 60
+# Неподтверждённое сообщение Redis вернёт в очередь только после visibility_timeout —
+# он должен быть больше самой долгой задачи
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': IMPORT_TASK_TIME_LIMIT + 5 * 60}
+
+CELERY_BEAT_SCHEDULE = {
+    'release-expired-reservations': {
+        'task': 'backend.tasks.release_expired_reservations',
+        'schedule': 60.0,
+    },
+    'relay-outbox': {
+        'task': 'backend.tasks.relay_outbox',
+        'schedule': float(os.environ.get('OUTBOX_RELAY_INTERVAL', 2)),
+    },
+    'purge-published-outbox-events': {
+        'task': 'backend.tasks.purge_published_outbox_events',
+        'schedule': 60.0 * 60,
+    },
+    'purge-expired-confirm-tokens': {
+        'task': 'backend.tasks.purge_expired_confirm_tokens',
+        'schedule': 60.0 * 60,
+    },
+    'flush-outgoing-emails': {
+        'task': 'backend.tasks.flush_outgoing_emails',
+        'schedule': float(os.environ.get('EMAIL_FLUSH_INTERVAL', 5)),
+    },
+}
+
+# Аутентификация по токену: сколько пользователь хранится в кэше процесса и в общем кэше, сек.
+TOKEN_AUTH_LOCAL_TTL = 5
+TOKEN_AUTH_CACHE_TTL = 5 * 60
+
+# Срок действия токена подтверждения email, сек. Просроченные токены удаляет задача
+# purge_expired_confirm_tokens (CELERY_BEAT_SCHEDULE)
+CONFIRM_EMAIL_TOKEN_TTL = int(os.environ.get('CONFIRM_EMAIL_TOKEN_TTL', 24 * 60 * 60))
+
+# Outbox: сколько событий публикуется за один проход relay (backend/outbox.py)
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 500))
+# Сколько хранятся опубликованные события, сек. Их удаляет задача purge_published_outbox_events
+OUTBOX_RETENTION = int(os.environ.get('OUTBOX_RETENTION', 7 * 24 * 60 * 60))
+
+# Корзина
+# Время резерва товара при добавлении в корзину, сек. 0 — резервы отключены,
+# остаток проверяется только при добавлении.
+CART_RESERVATION_TTL = int(os.environ.get('CART_RESERVATION_TTL', 0))
+# Сколько хранится в кэше ID корзины пользователя, сек.
+BASKET_CACHE_TIMEOUT = 60 * 60
+
 # Email
 DEFAULT_FROM_EMAIL = 'noreply@localhost'
+# Очередь писем (backend/mail.py): размер пачки на одно SMTP-соединение,
+# число попыток и экспоненциальная задержка между ними, сек.
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 100))
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BACKOFF = 30
+EMAIL_RETRY_BACKOFF_MAX = 60 * 60
+# На сколько письма из пачки скрываются от параллельных отправок, сек.
+EMAIL_SEND_LEASE = 5 * 60